@@ -0,0 +1,140 @@
+from __future__ import annotations
+import math
+import statistics
+
+# the frame statistics need pandas (analysis only), the interval helpers
+# are also used by the benchmark runner
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+try:
+    import scipy.stats as st
+except ImportError:
+    st = None
+
+# Statistics of the analysis notebook, shared with the comparison CLI and
+# the adaptive iterations of queries.run
+
+def critValue(dof: int, alpha: float = 0.05) -> float:
+    # normal-value if dof > 30, else t-value
+    if st is None:
+        raise ImportError("confidence intervals need the scipy package")
+    return st.norm.ppf(1 - alpha/2) if dof > 30 else st.t.ppf(1 - alpha/2, df=dof)
+
+def ciHalfWidth(values: list, alpha: float = 0.05) -> float:
+    '''
+    Half-width of CI's confidence interval of the mean for a plain list
+    '''
+    if len(values) < 2:
+        return math.inf
+    return critValue(len(values) - 1, alpha) * statistics.stdev(values) / math.sqrt(len(values))
+
+# stored runs (results.loadResults) also have a run_id, logs do not
+def runKeys(df: pd.DataFrame) -> list:
+    return ["test_no", "run_id"] if "run_id" in df else ["test_no"]
+
+def transformFrame(df: pd.DataFrame) -> pd.DataFrame:
+    # groups by the sample in each iteration
+    df = (
+        df
+        .groupby(["machine", "db_type","variant","function","operation","db_size"] + runKeys(df) + ["iteration"], dropna=False)
+        .agg({
+            "cpu_util": "median",
+            "disk_read": "max",
+            "disk_write": "max",
+            "disk_used": "max",
+            "disk_free": "min",
+            "virtual_used": "max",
+            "virtual_free": "min",
+            "response_time": "mean"
+            })
+    )
+
+    return df.reset_index()
+
+# Treat iterations as dependant and tests as independant
+def blockCI(
+        df: pd.DataFrame,
+        value_col: str,
+        alpha: float=0.05,
+        execute_only: bool=True
+    ) -> pd.DataFrame:
+
+    if execute_only:
+        df = df[df["operation"] == "execute"]
+        group = ['machine','db_type','variant','function','db_size']
+    else:
+        df = df[df["operation"] != "execute"]
+        group = ['machine','db_type','variant','operation','db_size']
+
+
+    # iteration mean
+    iter_df = (
+        df
+        .groupby(['machine','db_type','variant','function','operation','db_size'] + runKeys(df), dropna=False)[value_col]
+        .mean()
+        .reset_index(name='iter_mean')
+    )
+    
+    # mean within between tests
+    test_df = (
+        iter_df
+        .groupby(group)['iter_mean']
+        .agg(['mean','std','count'])
+        .reset_index()
+    )
+
+    # standard error
+    test_df['se'] = test_df['std'] / np.sqrt(test_df['count'])
+
+    # get t value for sample
+    test_df['t'] = test_df['count'].apply(lambda n: st.t.ppf(1 - alpha/2, df=n-1))
+
+    # error
+    test_df['error'] = test_df['se'] * test_df['t']
+
+    # CI - lower and upper bounds
+    test_df['ci_lower'] = test_df['mean'] - test_df['error']
+    test_df['ci_upper'] = test_df['mean'] + test_df['error']
+
+    # filter columns
+    test_df = test_df[group + ['mean','ci_lower','ci_upper']]
+
+    return test_df
+
+# Treat all iterations as independant
+def CI(
+    df: pd.DataFrame,
+    group: list,
+    value_col: str,
+    alpha: float = 0.05
+) -> pd.DataFrame:
+    # mean between tests
+    test_df = (
+        df
+        .groupby(group)[value_col]
+        .agg(['mean', 'std', 'count'])
+        .reset_index()
+    )
+
+    # standard error
+    test_df['se'] = test_df['std'] / np.sqrt(test_df['count'])
+
+    # degrees of freedom
+    test_df['df'] = test_df['count'] - 1
+
+    # normal-value if df > 30, else t‐value
+    test_df['crit'] = test_df['df'].apply(lambda df: critValue(df, alpha))
+
+    # margin of error
+    test_df['error'] = test_df['se'] * test_df['crit']
+
+    # build confidence bounds
+    test_df['ci_lower'] = test_df['mean'] - test_df['error']
+    test_df['ci_upper'] = test_df['mean'] + test_df['error']
+
+    # return only the requested columns
+    return test_df[group + ['mean', 'ci_lower', 'ci_upper']]
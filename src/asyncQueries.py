@@ -0,0 +1,252 @@
+from queries import data_pool, insertDocs, read_many_struct, read_many_unstruct
+from dataGen import genBirthday
+from keys import newKey, nextKey
+from pymongo.asynchronous.database import AsyncDatabase
+
+# Async twins of the queries in queries.py, same names and same operations
+# on the same data pool, for pymongo's AsyncMongoClient.
+
+# -- Structured Queries
+
+async def insertOneStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to insert a single document
+    '''
+    await db[col_name].insert_one(data_pool["struct_insert_one"].copy())
+
+async def insertLatestStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to insert a single new user, with a uid past the key space
+    '''
+    user = data_pool["struct_insert_one"].copy()
+    user["uid"] = newKey(db, col_name)
+    await db[col_name].insert_one(user)
+
+async def insertManyStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to insert a large amount of data
+    '''
+    await db[col_name].insert_many(insertDocs("struct_insert_many"))
+
+async def readOneStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to read a single data point, uid from the key distribution
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].find_one({"uid": uid})
+
+async def readManyStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to read all uid % 4 = 0, drained
+    '''
+    await db[col_name].find(read_many_struct).to_list()
+
+async def updateOneStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to update a document's age and DOB
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].update_one(
+        {"uid": uid},
+        {"$set": {"birthday": "1-1-2000", "age": 25}}
+    )
+
+async def updateManyStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to update the Calgary to Lethbridge in all documents
+    '''
+    await db[col_name].update_many(
+        {"address.city": "Calgary"},
+        {"$set": {"address.city": "Lethbridge"}}
+    )
+
+async def replaceOneStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to replace a document with a new one
+    '''
+    uid = nextKey(db, col_name)
+    new_doc = data_pool["struct_insert_one"].copy()
+    new_doc.pop("_id", None)
+    await db[col_name].replace_one(
+        {"uid": uid},
+        new_doc
+    )
+
+async def insertManyThenDeleteManyStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Complex query: Insert many → Delete users with age > 60
+    '''
+    await db[col_name].insert_many(insertDocs("struct_insert_many"))
+    await db[col_name].delete_many(
+        {"age": {"$gt": 60}}
+    )
+
+async def insertOneThenUpdateBirthdayStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Complex query: Insert one user → Update that user's birthday
+    '''
+    user = data_pool["struct_insert_one"].copy()
+    await db[col_name].insert_one(user)
+
+    new_birthday = genBirthday(user["age"], user["uid"]).strftime("%d-%m-%Y")
+
+    await db[col_name].update_one(
+        {"uid": user["uid"]},
+        {"$set": {"birthday": new_birthday}}
+    )
+
+async def readThenDeleteOldUsersStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Complex query: Read all users with age > 130, then delete them one by one
+    '''
+    old_users = await db[col_name].find({"age": {"$gt": 130}}, {"uid": 1}).to_list()
+
+    for user in old_users:
+        await db[col_name].delete_one(
+            {"uid": user["uid"]}
+        )
+
+async def aggregateStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to get the variance in all the ages in the dataset
+    '''
+    pipeline = [
+        {"$group": {"_id": None, "stdDev": {"$stdDevPop": "$age"}}},
+        {"$project": {"variance": {"$multiply": ["$stdDev", "$stdDev"]}}}
+    ]
+    cursor = await db[col_name].aggregate(pipeline)
+    await cursor.to_list()
+
+async def scanStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Query to read a short range of 100 documents from a uid
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].find({"uid": {"$gte": uid}}).sort("uid", 1).limit(100).to_list()
+
+async def readModifyWriteStruct(db: AsyncDatabase, col_name: str):
+    '''
+    Reads a user then writes back its age + 1, both on the same uid
+    '''
+    uid = nextKey(db, col_name)
+    user = await db[col_name].find_one({"uid": uid})
+    if user is not None:
+        await db[col_name].update_one({"uid": uid}, {"$set": {"age": user["age"] + 1}})
+
+# -- Unstructured Queries
+
+async def insertOneUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Inserts one unstructured document into the collection
+    '''
+    await db[col_name].insert_one(data_pool["unstruct_insert_one"].copy())
+
+async def insertLatestUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Inserts one new unstructured document, with a uid past the key space
+    '''
+    user = data_pool["unstruct_insert_one"].copy()
+    user["uid"] = newKey(db, col_name)
+    await db[col_name].insert_one(user)
+
+async def insertManyUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Inserts many unstructured documents into the collection
+    '''
+    await db[col_name].insert_many(insertDocs("unstruct_insert_many"))
+
+async def readOneUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Reads one unstructured document from the collection
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].find_one({"uid": uid})
+
+async def readManyUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Reads many unstructured documents from the collection, drained
+    '''
+    await db[col_name].find(read_many_unstruct).to_list()
+
+async def updateOneUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Updates a document's timestamp and likes.
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].update_one(
+        {"uid": uid},
+        {"$set": {"timestamp": "01-01-2000 00:00:00", "likes": 25}}
+    )
+
+async def updateManyUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Marks all users with likes >= 30 as archived = true
+    '''
+    await db[col_name].update_many(
+        {"likes": {"$exists": True, "$gte": 30}},
+        {"$set": {"archived": True}}
+    )
+
+async def replaceOneUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Replaces a document by uid with a new document.
+    '''
+    uid = nextKey(db, col_name)
+    new_doc = data_pool["unstruct_insert_one"].copy()
+    new_doc.pop("_id", None)
+    await db[col_name].replace_one({"uid": uid}, new_doc)
+
+async def insertManyThenDeleteManyUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Complex query: Insert many documents then deletes users with likes > 60
+    '''
+    await db[col_name].insert_many(insertDocs("unstruct_insert_many"))
+    await db[col_name].delete_many({"likes": {"$exists": True, "$gt": 60}})
+
+async def insertOneThenUpdateTimestampUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Inserts one document then updates the timestamp.
+    '''
+    user = data_pool["unstruct_insert_one"].copy()
+    await db[col_name].insert_one(user)
+    new_ts = "01-01-2025 00:00:00"
+    await db[col_name].update_one(
+        {"uid": user.get("uid")},
+        {"$set": {"timestamp": new_ts}}
+    )
+
+async def readThenDeleteManyLikesUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Finds documents with 130+ likes then deletes them one by one.
+    '''
+    old_users = await db[col_name].find({"likes": {"$exists": True, "$gt": 130}}, {"uid": 1}).to_list()
+    for user in old_users:
+        await db[col_name].delete_one({"uid": user["uid"]})
+
+async def aggregateUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Computes the variance of all likes values.
+    '''
+    pipeline = [
+        {"$match": {"likes": {"$type": "number"}}},
+        {"$group": {"_id": None, "stdDev": {"$stdDevPop": "$likes"}}},
+        {"$project": {"variance": {"$multiply": ["$stdDev", "$stdDev"]}}}
+    ]
+    cursor = await db[col_name].aggregate(pipeline)
+    await cursor.to_list()
+
+async def scanUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Reads a short range of 100 documents from a uid
+    '''
+    uid = nextKey(db, col_name)
+    await db[col_name].find({"uid": {"$gte": uid}}).sort("uid", 1).limit(100).to_list()
+
+async def readModifyWriteUnstruct(db: AsyncDatabase, col_name: str):
+    '''
+    Reads a document then writes back its likes + 1, both on the same uid
+    '''
+    uid = nextKey(db, col_name)
+    user = await db[col_name].find_one({"uid": uid})
+    if user is not None:
+        await db[col_name].update_one({"uid": uid}, {"$set": {"likes": user.get("likes", 0) + 1}})
@@ -0,0 +1,152 @@
+from monitor import LatencyHistogram
+from queries import updateDataPool, deleteCol, createCol, prepareCall
+from dataGen import loadData
+from keys import KEY_DISTRIBUTIONS, registerKeys, setDistribution
+from loadGen import runLoad
+import asyncQueries
+import argparse
+import asyncio
+import json
+import os
+import time
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.errors import PyMongoError
+
+URI = "mongodb://localhost:27017/"
+
+async def asyncWorker(fn: callable, db, col_name: str, stop_at: int, histogram: LatencyHistogram, errors: dict):
+    '''
+    Closed loop: awaits fn(db, col_name) back to back until stop_at (ns)
+    '''
+    while time.perf_counter_ns() < stop_at:
+        prepareCall(fn)
+        time_0 = time.perf_counter_ns()
+        try:
+            await fn(db, col_name)
+        except PyMongoError as e:
+            name = type(e).__name__
+            errors[name] = errors.get(name, 0) + 1
+            continue
+
+        histogram.record(time.perf_counter_ns() - time_0)
+
+async def runAsyncLoad(
+        client: AsyncMongoClient,
+        fn_name: str,
+        db_name: str,
+        col_name: str,
+        concurrency: int,
+        duration: float = 10
+    ) -> dict:
+    '''
+    Runs concurrency coroutines of the async query on one event loop and
+    reports the throughput and latency percentiles like loadGen.runLoad
+    '''
+    fn = getattr(asyncQueries, fn_name)
+    histogram = LatencyHistogram()
+    errors = {}
+
+    start = time.perf_counter_ns()
+    stop_at = start + int(duration * 1e9)
+    await asyncio.gather(*[
+        asyncWorker(fn, client[db_name], col_name, stop_at, histogram, errors)
+        for _ in range(concurrency)
+    ])
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+
+    return {
+        "function": fn_name,
+        "mode": "async",
+        "workers": concurrency,
+        "duration": elapsed,
+        "ops": histogram.total,
+        "errors": errors,
+        "ops_per_sec": histogram.total / elapsed,
+        "latency": histogram.summary(),
+        "histogram": histogram.toJson(),
+    }
+
+async def sweepAsync(
+        fn_name: str,
+        db_name: str,
+        path: str,
+        levels: list,
+        duration: float = 10,
+        pool_size: int = 100,
+        compare: bool = False
+    ) -> list:
+    '''
+    Runs the async query at every concurrency level on a fresh copy of the
+    dataset, and with compare the threaded sync path (loadGen) at the same
+    number of workers on the same data. Reports go to logs/async.
+    '''
+    col_name = os.path.basename(path).split(".")[0]
+
+    print(f"Opening file {path}...")
+    data = loadData(path)
+    registerKeys(db_name, col_name, data)
+
+    # setup and the sync path use the sync client
+    sync_client = MongoClient(URI, maxPoolSize=pool_size)
+    async_client = AsyncMongoClient(URI, maxPoolSize=pool_size)
+
+    reports = []
+    for level in levels:
+        deleteCol(sync_client[db_name], col_name)
+        createCol(sync_client[db_name], col_name, data)
+
+        print(f"Running async {col_name}-{fn_name}-coroutines:{level}")
+        report = {"async": await runAsyncLoad(async_client, fn_name, db_name, col_name, level, duration)}
+
+        if compare:
+            deleteCol(sync_client[db_name], col_name)
+            createCol(sync_client[db_name], col_name, data)
+
+            print(f"Running sync {col_name}-{fn_name}-threads:{level}")
+            report["sync"] = await asyncio.to_thread(
+                runLoad, sync_client, fn_name, db_name, col_name, level, duration
+            )
+
+        for mode, r in report.items():
+            print(
+                f"{mode}: {r['ops_per_sec']:.1f} ops/sec, "
+                f"{sum(r['errors'].values())} errors, "
+                f"p99 {r['latency'].get('p99', 0) * 1000:.2f} ms"
+            )
+
+        reports.append(report)
+
+    await async_client.close()
+    sync_client.close()
+
+    os.makedirs(f"logs/async/{db_name}/{col_name}", exist_ok=True)
+    with open(f"logs/async/{db_name}/{col_name}/{fn_name}_async_{col_name}.json", "w") as f:
+        json.dump(reports, f, indent=4)
+
+    return reports
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio benchmark runner on AsyncMongoClient")
+    parser.add_argument("fn", help="query function, e.g. readOneStruct")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_10000.json")
+    parser.add_argument("--levels", default="1,10,100,1000", help="comma separated in-flight coroutines")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--pool-size", type=int, default=100, help="maxPoolSize of both clients")
+    parser.add_argument("--compare", action="store_true", help="also run the threaded sync path")
+    parser.add_argument("--keys", choices=KEY_DISTRIBUTIONS, default="middle", help="uid distribution of the single document queries")
+    args = parser.parse_args()
+
+    db_name = "unstructured" if args.fn.endswith("Unstruct") else "structured"
+
+    # generate the data in the data pool
+    updateDataPool()
+    setDistribution(args.keys)
+
+    asyncio.run(sweepAsync(
+        args.fn, db_name, args.path,
+        [int(x) for x in args.levels.split(",")],
+        args.duration,
+        args.pool_size,
+        args.compare
+    ))
@@ -0,0 +1,225 @@
+from dataGen import DATA_EXTENSIONS, iterData, loadData
+from array import array
+import argparse
+import json
+import mmap
+import os
+import time
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient
+
+# -- Cache files
+def cachePath(path: str) -> str:
+    '''
+    structured/data_10.json -> structured/data_10.bson
+    '''
+    for ext in DATA_EXTENSIONS:
+        if path.endswith(ext):
+            return path[:-len(ext)] + ".bson"
+
+    raise TypeError("not a dataset file")
+
+def convertToCache(path: str) -> str:
+    '''
+    One-time conversion of a dataset to concatenated BSON plus an offset
+    index (.bson.idx, offset of every document and the end of the file)
+    and the uid range of the documents (.bson.keys, so the key space is
+    known without decoding them)
+    '''
+    cache = cachePath(path)
+    offsets = array("Q", [0])
+    uids = {"lo": None, "hi": None, "count": 0}
+
+    with open(cache, "wb") as f:
+        for doc in iterData(path):
+            raw = bson.encode(doc)
+            f.write(raw)
+            offsets.append(offsets[-1] + len(raw))
+
+            if "uid" in doc:
+                uid = doc["uid"]
+                uids["lo"] = uid if uids["lo"] is None else min(uids["lo"], uid)
+                uids["hi"] = uid if uids["hi"] is None else max(uids["hi"], uid)
+                uids["count"] += 1
+
+    with open(cache + ".idx", "wb") as f:
+        offsets.tofile(f)
+
+    with open(cache + ".keys", "w") as f:
+        json.dump(uids, f)
+
+    return cache
+
+class BsonCache:
+    '''
+    Memory-mapped view of a converted dataset. Documents are sliced out of
+    the map as RawBSONDocument, so they are never decoded and the driver
+    sends the bytes as they are.
+
+    Iterating it yields the documents one at a time from the open map, so
+    it can be passed to insert_many (repeatedly) in place of a list and
+    only the batch being sent is copied out of the page cache.
+    '''
+
+    def __init__(self, cache: str):
+        self.offsets = array("Q")
+        with open(cache + ".idx", "rb") as f:
+            self.offsets.frombytes(f.read())
+
+        # (lo, hi, count) of the uids, read by keys.KeySpace.fromData
+        self.uid_range = None
+        if os.path.exists(cache + ".keys"):
+            with open(cache + ".keys") as f:
+                uids = json.load(f)
+            self.uid_range = (uids["lo"], uids["hi"], uids["count"])
+
+        self.file = open(cache, "rb")
+        # empty files cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        offsets = self.offsets
+        for i in range(len(self)):
+            yield RawBSONDocument(self.map[offsets[i]:offsets[i + 1]])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+    def nbytes(self) -> int:
+        return self.offsets[-1]
+
+    def documents(self, start: int = 0, stop: int = None) -> list:
+        stop = len(self) if stop is None else min(stop, len(self))
+        offsets = self.offsets
+        return [
+            RawBSONDocument(self.map[offsets[i]:offsets[i + 1]])
+            for i in range(start, stop)
+        ]
+
+    def batches(self, batch_size: int = 10_000):
+        '''
+        Yields lists of RawBSONDocument of batch_size documents
+        '''
+        for start in range(0, len(self), batch_size):
+            yield self.documents(start, start + batch_size)
+
+def openCache(path: str) -> BsonCache:
+    '''
+    Opens the cache of a dataset, converting it first if it is missing
+    (or built before the uid range was kept) or older than the dataset
+    '''
+    cache = cachePath(path)
+    missing = not all(os.path.exists(cache + ext) for ext in [".idx", ".keys"])
+    if missing or os.path.getmtime(cache) < os.path.getmtime(path):
+        convertToCache(path)
+
+    return BsonCache(cache)
+
+def loadCached(path: str) -> BsonCache:
+    '''
+    The open cache of a dataset, iterated as RawBSONDocument straight from
+    the map. It stays mapped until it is closed or garbage collected.
+    '''
+    return openCache(path)
+
+def insertCached(col, cache: BsonCache, batch_size: int = 10_000):
+    '''
+    Inserts the cache batch by batch without decoding the documents
+    '''
+    for batch in cache.batches(batch_size):
+        col.insert_many(batch)
+
+# -- Benchmark
+def benchmarkCache(client: MongoClient, db_name: str, path: str, iterations: int = 5) -> dict:
+    '''
+    Compares load and insert time of the JSON path (json decode, then
+    BSON encode in insert_many) with the cache path (mmap, raw inserts)
+    '''
+    col_name = os.path.basename(path).split(".")[0] + "_cache_bench"
+    col = client[db_name][col_name]
+
+    # conversion is a one time cost, keep it out of the iterations
+    time_0 = time.perf_counter()
+    convertToCache(path)
+    convert_time = time.perf_counter() - time_0
+
+    results = {"convert": convert_time, "json": [], "bson": []}
+
+    for i in range(iterations):
+        print(f"Running cache benchmark {col_name}-iteration:{i}")
+
+        # json path
+        col.drop()
+        time_0 = time.perf_counter()
+        data = loadData(path)
+        time_1 = time.perf_counter()
+        col.insert_many(data)
+        time_2 = time.perf_counter()
+        results["json"].append({"load": time_1 - time_0, "insert": time_2 - time_1})
+        del data
+
+        # cache path, the documents are read from the map while inserting
+        col.drop()
+        time_0 = time.perf_counter()
+        cache = openCache(path)
+        time_1 = time.perf_counter()
+        col.insert_many(cache)
+        time_2 = time.perf_counter()
+        cache.close()
+        results["bson"].append({"load": time_1 - time_0, "insert": time_2 - time_1})
+
+    col.drop()
+
+    # average the iterations
+    for key in ["json", "bson"]:
+        for step in ["load", "insert"]:
+            results[f"{key}_{step}_mean"] = sum(r[step] for r in results[key]) / iterations
+
+    print(
+        f"load {results['json_load_mean']:.3f}s -> {results['bson_load_mean']:.3f}s, "
+        f"insert {results['json_insert_mean']:.3f}s -> {results['bson_insert_mean']:.3f}s"
+    )
+
+    os.makedirs(f"logs/cache/{db_name}", exist_ok=True)
+    with open(f"logs/cache/{db_name}/{col_name}.json", "w") as f:
+        json.dump(results, f, indent=4)
+
+    return results
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pre-encoded BSON dataset cache")
+    parser.add_argument("paths", nargs="*", help="dataset files, every dataset when empty")
+    parser.add_argument("--benchmark", action="store_true", help="compare the JSON and cache paths")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = args.paths
+    if not paths:
+        paths = [
+            f"{folder}/{x}"
+            for folder in ["structured", "unstructured", "datapool"] if os.path.isdir(folder)
+            for x in os.listdir(folder) if x.endswith(DATA_EXTENSIONS)
+        ]
+
+    if args.benchmark:
+        client = MongoClient("mongodb://localhost:27017/")
+        for path in paths:
+            db_name = "unstructured" if "unstructured" in path else "structured"
+            benchmarkCache(client, db_name, path, args.iterations)
+    else:
+        for path in paths:
+            print(f"Converting {path}...")
+            convertToCache(path)
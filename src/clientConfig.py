@@ -0,0 +1,40 @@
+import importlib.util
+from pymongo import MongoClient
+
+URI = "mongodb://localhost:27017/"
+
+# client settings of the benchmark matrix, passed to MongoClient as they are
+CLIENT_CONFIGS = {
+    "default": {},
+    "pool_10": {"maxPoolSize": 10},
+    "pool_500": {"maxPoolSize": 500},
+    "pool_100_min_50": {"maxPoolSize": 100, "minPoolSize": 50},
+    "wait_100ms": {"maxPoolSize": 10, "waitQueueTimeoutMS": 100},
+    "zlib": {"compressors": "zlib"},
+    "snappy": {"compressors": "snappy"},
+    "zstd": {"compressors": "zstd"},
+}
+
+# python module each compressor needs, zlib is in the standard library
+COMPRESSOR_MODULES = {"zlib": "zlib", "snappy": "snappy", "zstd": "zstandard"}
+
+def configAvailable(config: str) -> bool:
+    '''
+    False when the config uses a compressor whose module is not installed
+    (the driver would silently fall back to no compression)
+    '''
+    compressors = CLIENT_CONFIGS[config].get("compressors", "")
+    return all(
+        importlib.util.find_spec(COMPRESSOR_MODULES[c]) is not None
+        for c in compressors.split(",") if c
+    )
+
+def makeClient(config: str = "default", uri: str = URI, **kwargv) -> MongoClient:
+    '''
+    MongoClient with the settings of a client config, extra keyword
+    arguments (e.g. event_listeners) are passed through
+    '''
+    if config not in CLIENT_CONFIGS:
+        raise TypeError("invalid client config")
+
+    return MongoClient(uri, **CLIENT_CONFIGS[config], **kwargv)
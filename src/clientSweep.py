@@ -0,0 +1,88 @@
+from monitor import serverSnapshot, diffServer, trackedProcesses, processesSnapshot, diffProcesses
+from queries import updateDataPool, deleteCol, createCol
+from clientConfig import CLIENT_CONFIGS, configAvailable, makeClient
+from dataGen import loadData
+from keys import registerKeys
+from loadGen import runLoad
+import argparse
+import json
+import os
+
+def sweepClients(
+        fn_name: str,
+        db_name: str,
+        path: str,
+        configs: list,
+        workers: int = 16,
+        duration: float = 10
+    ) -> list:
+    '''
+    Runs the load generator with every client config on a fresh copy of
+    the dataset and records throughput, latency, the bytes mongod saw on
+    the wire and the client CPU time
+    '''
+    col_name = os.path.basename(path).split(".")[0]
+
+    print(f"Opening file {path}...")
+    data = loadData(path)
+    registerKeys(db_name, col_name, data)
+
+    reports = []
+    for config in configs:
+        if not configAvailable(config):
+            print(f"Skipping {config}, compressor module is not installed")
+            continue
+
+        client = makeClient(config)
+        deleteCol(client[db_name], col_name)
+        createCol(client[db_name], col_name, data)
+
+        processes = {"client": trackedProcesses()["client"]}
+        server_0 = serverSnapshot(client[db_name])
+        processes_0 = processesSnapshot(processes)
+
+        print(f"Running client config {col_name}-{fn_name}-{config}")
+        report = runLoad(client, fn_name, db_name, col_name, workers, duration)
+
+        server = diffServer(server_0, serverSnapshot(client[db_name]))["delta"]
+        client_cpu = diffProcesses(processes_0, processesSnapshot(processes)).get("client", {})
+        client.close()
+
+        report.update({
+            "client_config": config,
+            "settings": CLIENT_CONFIGS[config],
+            "network_bytes_in": server.get("network_bytes_in"),
+            "network_bytes_out": server.get("network_bytes_out"),
+            "client_cpu_user": client_cpu.get("cpu_user"),
+            "client_cpu_sys": client_cpu.get("cpu_sys"),
+        })
+        reports.append(report)
+
+        print(
+            f"{config}: {report['ops_per_sec']:.1f} ops/sec, "
+            f"wire in/out {report['network_bytes_in']}/{report['network_bytes_out']} bytes, "
+            f"client cpu {report['client_cpu_user']}s"
+        )
+
+    os.makedirs(f"logs/clients/{db_name}/{col_name}", exist_ok=True)
+    with open(f"logs/clients/{db_name}/{col_name}/{fn_name}_clients_{col_name}.json", "w") as f:
+        json.dump(reports, f, indent=4)
+
+    return reports
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="connection pool and wire compression sweep")
+    parser.add_argument("fn", help="query function, e.g. insertManyStruct")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_10000.json")
+    parser.add_argument("--configs", default=",".join(CLIENT_CONFIGS), help="comma separated client configs")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    db_name = "unstructured" if args.fn.endswith("Unstruct") else "structured"
+
+    # generate the data in the data pool
+    updateDataPool()
+
+    sweepClients(args.fn, db_name, args.path, args.configs.split(","), args.workers, args.duration)
@@ -0,0 +1,156 @@
+from analysisStats import transformFrame, blockCI, CI, runKeys
+from logIngest import loadLogs
+from results import loadResults
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+import scipy.stats as st
+
+KEYS = ["db_type", "variant", "function", "db_size"]
+
+def loadSet(path: str, label: str, variant: str = None) -> pd.DataFrame:
+    '''
+    One iteration per row (transformFrame) of the queries in comma
+    separated log folders or results stores, machine is replaced by the
+    label so blockCI keeps the two sets apart
+
+    variant: only that variant (tags folder) of the set, renamed to
+    "selected" so it is compared with the one selected in the other set
+    '''
+    df = pd.concat([
+        loadResults(p) if p.endswith(".sqlite") else loadLogs(p)
+        for p in path.split(",")
+    ], ignore_index=True)
+    df = transformFrame(df)
+    df = df[df["operation"] == "execute"].assign(machine=label)
+
+    if variant is not None:
+        df = df[df["variant"] == variant].assign(variant="selected")
+
+    return df
+
+def testCounts(df: pd.DataFrame) -> pd.Series:
+    '''
+    Tests per key, a key can have fewer tests than the set (a query that
+    was added later or a run that crashed)
+    '''
+    return df[KEYS + runKeys(df)].drop_duplicates().groupby(KEYS, dropna=False).size().rename("tests")
+
+def splitKeys(df: pd.DataFrame) -> tuple:
+    '''
+    Rows of the keys with at least 2 tests and rows of the keys with one
+    '''
+    df = df.merge(testCounts(df).reset_index(), on=KEYS)
+    return df[df["tests"] > 1], df[df["tests"] < 2]
+
+def units(df: pd.DataFrame, metric: str) -> pd.DataFrame:
+    '''
+    Independent observations per key: block means of its tests like
+    blockCI, or its iterations like CI when the key has a single test
+    '''
+    blocks, single = splitKeys(df)
+    return pd.concat([
+        blocks.groupby(KEYS + runKeys(df), dropna=False)[metric].mean().reset_index().assign(unit="test"),
+        single.groupby(KEYS + runKeys(df) + ["iteration"], dropna=False)[metric].mean().reset_index().assign(unit="iteration"),
+    ], ignore_index=True)
+
+def setCI(df: pd.DataFrame, metric: str, alpha: float) -> pd.DataFrame:
+    blocks, single = splitKeys(df)
+    return pd.concat([
+        blockCI(blocks, metric, alpha),
+        CI(single, ["machine"] + KEYS, metric, alpha),
+    ], ignore_index=True).drop(columns="machine")
+
+def compare(
+        base: pd.DataFrame,
+        new: pd.DataFrame,
+        metric: str = "response_time",
+        alpha: float = 0.05,
+        threshold: float = 0.05
+    ) -> pd.DataFrame:
+    '''
+    Per (db_type, variant, function, db_size): Welch's t-test of new against base,
+    the relative change with its confidence interval, and whether it is a
+    significant regression (metric higher by more than threshold)
+
+    missing: "base" or "new" for keys only one set has, untestable: keys
+    with no test (missing, or fewer than 2 units in a set)
+    '''
+    report = setCI(base, metric, alpha).merge(
+        setCI(new, metric, alpha), on=KEYS, how="outer", suffixes=("_base", "_new"), indicator="missing"
+    )
+    report["missing"] = report["missing"].map({"left_only": "new", "right_only": "base"}).astype(object)
+
+    base_units = units(base, metric).groupby(KEYS, dropna=False)
+    new_units = units(new, metric).groupby(KEYS, dropna=False)
+
+    results = []
+    for key, missing in zip(report[KEYS].itertuples(index=False), report["missing"]):
+        if pd.notna(missing):
+            results.append((None, None, np.nan, np.nan, np.nan))
+            continue
+
+        a = base_units.get_group(tuple(key))
+        b = new_units.get_group(tuple(key))
+        unit_a, unit_b = a["unit"].iloc[0], b["unit"].iloc[0]
+        a, b = a[metric].to_numpy(), b[metric].to_numpy()
+
+        if len(a) < 2 or len(b) < 2:
+            results.append((unit_a, unit_b, np.nan, np.nan, np.nan))
+            continue
+
+        result = st.ttest_ind(b, a, equal_var=False)
+        low, high = result.confidence_interval(1 - alpha)
+        results.append((unit_a, unit_b, result.pvalue, low / a.mean(), high / a.mean()))
+
+    report[["unit_base", "unit_new", "p_value", "change_lower", "change_upper"]] = pd.DataFrame(
+        results, columns=["unit_base", "unit_new", "p_value", "change_lower", "change_upper"], index=report.index
+    )
+    report["change"] = report["mean_new"] / report["mean_base"] - 1
+    report["untestable"] = report["p_value"].isna()
+    report["significant"] = report["p_value"] < alpha
+    report["regression"] = report["significant"] & (report["change"] > threshold)
+
+    return report.sort_values(KEYS).reset_index(drop=True)
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare two result sets and fail on regressions")
+    parser.add_argument("base", help="log folders or results stores, e.g. logs/0medium,logs/1medium")
+    parser.add_argument("new", help="log folders or results stores, e.g. logs/0smalls,logs/1smalls")
+    parser.add_argument("--base-variant", default=None, help="compare only this variant of base, e.g. default")
+    parser.add_argument("--new-variant", default=None, help="against this variant of new, e.g. idx_uid")
+    parser.add_argument("--metric", default="response_time")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level")
+    parser.add_argument("--threshold", type=float, default=0.05, help="relative change that counts as a regression")
+    parser.add_argument("--output", default=None, help="also write the report as csv")
+    args = parser.parse_args()
+
+    # one variant against another, otherwise every variant against itself
+    base_variant, new_variant = args.base_variant, args.new_variant
+    if base_variant or new_variant:
+        base_variant, new_variant = base_variant or "default", new_variant or "default"
+
+    report = compare(
+        loadSet(args.base, "base", base_variant), loadSet(args.new, "new", new_variant),
+        args.metric, args.alpha, args.threshold
+    )
+
+    pd.set_option("display.width", 200)
+    print(report[KEYS + [
+        "mean_base", "mean_new", "change", "change_lower", "change_upper", "p_value", "regression"
+    ]].to_string(index=False))
+
+    if args.output:
+        report.to_csv(args.output, index=False)
+
+    # keys without a test would otherwise pass the gate silently
+    untestable = report[report["untestable"]]
+    if len(untestable):
+        print("untestable operations (missing from a set or fewer than 2 units):")
+        print(untestable[KEYS + ["missing", "unit_base", "unit_new"]].to_string(index=False))
+
+    regressions = report[report["regression"]]
+    print(f"{len(regressions)} of {len(report)} operations regressed by more than {args.threshold:.0%}, {len(untestable)} untestable")
+    sys.exit(1 if len(regressions) or len(untestable) else 0)
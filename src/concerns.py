@@ -0,0 +1,42 @@
+from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+# write concerns of the benchmark matrix and the ingest sweep, "default"
+# leaves it to the server (w:1 on a standalone or single node replica set)
+WRITE_CONCERNS = {
+    "default": WriteConcern(),
+    "w1": WriteConcern(w=1),
+    "w0": WriteConcern(w=0),
+    "j": WriteConcern(w=1, j=True),
+    "majority": WriteConcern(w="majority"),
+}
+
+# majority needs a replica set, a single node one is enough
+READ_CONCERNS = {
+    "default": ReadConcern(),
+    "local": ReadConcern("local"),
+    "majority": ReadConcern("majority"),
+}
+
+def concernDatabase(
+        client: MongoClient,
+        db_name: str,
+        write_concern: str = "default",
+        read_concern: str = "default"
+    ) -> Database:
+    '''
+    Database whose collections (db[col_name] in the queries) send the
+    given write and read concerns
+    '''
+    if write_concern not in WRITE_CONCERNS:
+        raise TypeError("invalid write concern")
+    if read_concern not in READ_CONCERNS:
+        raise TypeError("invalid read concern")
+
+    return client.get_database(
+        db_name,
+        write_concern=WRITE_CONCERNS[write_concern],
+        read_concern=READ_CONCERNS[read_concern]
+    )
@@ -0,0 +1,91 @@
+from queries import deleteCol, createCol, read_many_struct, read_many_unstruct
+from dataGen import loadData
+import argparse
+import itertools
+import json
+import os
+import time
+from pymongo import MongoClient
+
+# projections of the sweep, None returns the full document
+PROJECTIONS = {
+    "full": None,
+    "uid": {"uid": 1},
+}
+
+def drainCursor(cursor) -> dict:
+    '''
+    Iterates the cursor to the end. find() does not contact the server,
+    the first next() sends the query, so both times are taken from the
+    moment the cursor is created.
+    '''
+    time_0 = time.perf_counter()
+    first = None
+    docs = 0
+    for _ in cursor:
+        if first is None:
+            first = time.perf_counter() - time_0
+        docs += 1
+
+    last = time.perf_counter() - time_0
+
+    return {
+        "first_doc_time": first if first is not None else last,
+        "last_doc_time": last,
+        "docs": docs,
+    }
+
+def sweepCursor(
+        client: MongoClient,
+        db_name: str,
+        path: str,
+        batch_sizes: list,
+        iterations: int = 5
+    ) -> list:
+    '''
+    Drains the read-many query for every (batch_size, projection) on the
+    dataset at path, batch_size 0 is the server default
+    '''
+    col_name = os.path.basename(path).split(".")[0]
+    query = read_many_struct if db_name == "structured" else read_many_unstruct
+
+    print(f"Opening file {path}...")
+    deleteCol(client[db_name], col_name)
+    createCol(client[db_name], col_name, loadData(path))
+    col = client[db_name][col_name]
+
+    results = []
+    for batch_size, projection in itertools.product(batch_sizes, PROJECTIONS):
+        for i in range(iterations):
+            print(f"Running cursor {col_name}-batch:{batch_size}-{projection}-iteration:{i}")
+            cursor = col.find(query, PROJECTIONS[projection], batch_size=batch_size)
+            results.append({
+                "batch_size": batch_size,
+                "projection": projection,
+                "iteration": i,
+                **drainCursor(cursor),
+            })
+
+    os.makedirs(f"logs/cursor/{db_name}", exist_ok=True)
+    with open(f"logs/cursor/{db_name}/cursor_{col_name}.json", "w") as f:
+        json.dump(results, f, indent=4)
+
+    return results
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="batch_size and projection sweep of the read-many queries")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_100000.json")
+    parser.add_argument("--batch-sizes", default="0,10,100,1000,10000")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    db_name = "unstructured" if args.path.startswith("unstructured") else "structured"
+
+    client = MongoClient("mongodb://localhost:27017/")
+
+    sweepCursor(
+        client, db_name, args.path,
+        [int(x) for x in args.batch_sizes.split(",")],
+        args.iterations
+    )
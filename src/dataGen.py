@@ -1,10 +1,28 @@
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from collections import deque
+import argparse
+import gc
+import gzip
+import hashlib
 import json
+import multiprocessing
 import random
-import uuid
 import os
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# dataset file extensions in the order they are looked up
+DATA_EXTENSIONS = (".json", ".ndjson", ".ndjson.gz", ".ndjson.zst")
+
 # -- General
 def intToStr(q: int) -> str:
     '''
@@ -37,26 +55,265 @@ def saveData(filename: str, data: list):
     with open(f"{filename}", "w") as f:
         json.dump(data, f, indent=4)
 
-def createJson(fnc: callable, size: int) -> list:
-    data = []
-    for i in range(size):
-        data.append(fnc(i))
+def createJson(fnc: callable, size: int, reference: datetime = None) -> list:
+    return generateRange(fnc, 0, size, reference)
 
-    return data
-  
-def bulkGenerate(func: callable, file_prefix: str, limit: int):
-    i = 10
+def generateRange(fnc: callable, start: int, stop: int, reference: datetime = None) -> list:
+    '''
+    Documents fnc(idx) for [start, stop), built by the columnar batch
+    generator of fnc when there is one and numpy is installed
+    '''
+    batch = BATCH_GENERATORS.get(fnc) if np is not None else None
+    if batch is not None:
+        return batch(start, stop, reference)
+
+    if reference is None:
+        return [fnc(i) for i in range(start, stop)]
+
+    return [fnc(i, reference) for i in range(start, stop)]
+
+def openData(filename: str, mode: str = "r"):
+    '''
+    Opens a dataset file as text, compression is taken from the extension
+    '''
+    if "w" in mode:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", compresslevel=6, encoding="utf-8", newline="\n")
+
+    if filename.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+        return zstandard.open(filename, mode + "t", encoding="utf-8", newline="\n")
+
+    return open(filename, mode, encoding="utf-8", newline="\n")
+
+def findData(stem: str) -> str:
+    '''
+    Returns the first existing dataset file for a path without extension
+    '''
+    for ext in DATA_EXTENSIONS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+
+    raise FileNotFoundError(f"no dataset found for {stem}")
 
+def iterData(filename: str):
+    '''
+    Yields the documents of a dataset one at a time.
+    NDJSON is streamed, legacy JSON arrays are loaded whole.
+    '''
+    if filename.endswith(".json"):
+        with open(filename, "r") as f:
+            yield from json.load(f)
+        return
+
+    with openData(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def loadData(filename: str) -> list:
+    return list(iterData(filename))
+
+def iterChunks(fnc: callable, start: int, stop: int, chunk_size: int = 10_000, reference: datetime = None):
+    '''
+    Yields fnc(idx) for the index range in lists of chunk_size documents
+    '''
+    for lo in range(start, stop, chunk_size):
+        yield generateRange(fnc, lo, min(lo + chunk_size, stop), reference)
+
+def encodeChunk(docs: list) -> list:
+    '''
+    One NDJSON line per document
+    '''
+    return [json.dumps(doc, separators=(",", ":")) + "\n" for doc in docs]
+
+def shardSeed(seed: int, shard: int) -> int:
+    '''
+    Seed of a shard, derived only from (base seed, shard index)
+    '''
+    digest = hashlib.sha256(f"{seed}:{shard}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def generateShard(args: tuple) -> list:
+    '''
+    Generates the encoded lines of one shard. The global random state is
+    re-seeded for the shard so the output does not depend on which
+    process runs it or what it ran before.
+    '''
+    fnc, shard, start, stop, shard_size, seed, reference = args
+    random.seed(shardSeed(seed, shard))
+
+    # always walk the shard from its first index so partial shards match
+    docs = generateRange(fnc, shard * shard_size, stop, reference)
+    return encodeChunk(docs[start - shard * shard_size:])
+
+def shardChunks(
+        fnc: callable,
+        start: int,
+        stop: int,
+        workers: int,
+        seed: int = 0,
+        reference: datetime = None,
+        shard_size: int = 10_000
+    ):
+    '''
+    Yields the encoded lines of [start, stop) shard by shard, in order.
+
+    Shards are fixed blocks of shard_size indexes seeded by (seed, shard
+    index), so the output is identical for any number of workers. At
+    most 2 shards per worker are in flight to keep memory bounded.
+    '''
+    reference = reference or datetime.now()
+
+    shards = [
+        (fnc, shard, max(start, shard * shard_size), min(stop, (shard + 1) * shard_size),
+            shard_size, seed, reference)
+        for shard in range(start // shard_size, (stop - 1) // shard_size + 1)
+    ]
+
+    if workers == 1:
+        for args in shards:
+            yield generateShard(args)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for args in shards:
+            pending.append(pool.apply_async(generateShard, (args,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+def writePrefixes(chunks, targets: dict):
+    '''
+    Writes NDJSON in one pass over chunks of encoded lines. targets maps a
+    document count to a filename, every file gets the first count documents
+    and is closed as soon as its count is reached, so only one chunk is in
+    memory.
+    '''
+    writers = {size: openData(filename, "w") for size, filename in targets.items()}
+    written = 0
+
+    try:
+        for lines in chunks:
+            if not writers:
+                break
+
+            # joined once, shared by every file that takes the whole chunk
+            block = "".join(lines)
+
+            for size in sorted(writers):
+                f = writers[size]
+                if written + len(lines) <= size:
+                    f.write(block)
+                else:
+                    f.write("".join(lines[:size - written]))
+
+                # file is complete
+                if written + len(lines) >= size:
+                    f.close()
+                    del writers[size]
+
+            written += len(lines)
+    finally:
+        for f in writers.values():
+            f.close()
+
+def prefixSizes(limit: int) -> list:
+    '''
+    10, 100, ... up to limit
+    '''
+    sizes = []
+    i = 10
     while i <= limit:
-        data = createJson(func, i)
+        sizes.append(i)
+        i = i*10
+
+    return sizes
+
+def streamChunks(
+        fnc: callable,
+        start: int,
+        stop: int,
+        chunk_size: int = 10_000,
+        workers: int = None,
+        seed: int = 0,
+        reference: datetime = None
+    ):
+    '''
+    Encoded chunks for the stream writer, serial or sharded when workers is set
+    '''
+    if workers:
+        return shardChunks(fnc, start, stop, workers, seed, reference, chunk_size)
+
+    return (encodeChunk(docs) for docs in iterChunks(fnc, start, stop, chunk_size, reference))
+
+def bulkGenerate(
+        func: callable,
+        file_prefix: str,
+        limit: int,
+        fmt: str = "json",
+        compression: str = None,
+        chunk_size: int = 10_000,
+        workers: int = None,
+        seed: int = 0,
+        reference: datetime = None
+    ):
+    '''
+    Creates the datasets 10 -> limit.
+
+    fmt "json": every size is regenerated from index 0 into an indented array
+    fmt "ndjson": one streamed pass writes every size as its prefix is reached,
+    compression: None, "gz" or "zst"
+    workers: generate ndjson in deterministic shards of chunk_size on a
+    process pool, seeded from seed
+    reference: date every generated date is relative to (now by default),
+    in every format with or without workers
+    '''
+    if workers and fmt != "ndjson":
+        raise ValueError("parallel generation writes ndjson only")
+
+    if fmt == "ndjson":
+        ext = ".ndjson" + (f".{compression}" if compression else "")
+        writePrefixes(
+            streamChunks(func, 0, limit, chunk_size, workers, seed, reference),
+            {size: f"{file_prefix}_{size}{ext}" for size in prefixSizes(limit)}
+        )
+        return
+
+    for i in prefixSizes(limit):
+        data = createJson(func, i, reference)
 
         saveData(f"{file_prefix}_{i}.json", data)
-        i = i*10
 
-def createPoolData(fnc: callable, filename: str, size: int = 1_000_000):
-    data = []
-    for i in range(1_000_000, 1_000_000 + size):
-        data.append(fnc(i))
+def createPoolData(
+        fnc: callable,
+        filename: str,
+        size: int = 1_000_000,
+        fmt: str = "json",
+        compression: str = None,
+        chunk_size: int = 10_000,
+        workers: int = None,
+        seed: int = 0,
+        reference: datetime = None
+    ):
+    if workers and fmt != "ndjson":
+        raise ValueError("parallel generation writes ndjson only")
+
+    if fmt == "ndjson":
+        ext = ".ndjson" + (f".{compression}" if compression else "")
+        writePrefixes(
+            streamChunks(fnc, 1_000_000, 1_000_000 + size, chunk_size, workers, seed, reference),
+            {size: f"datapool/{filename}{ext}"}
+        )
+        return
+
+    data = generateRange(fnc, 1_000_000, 1_000_000 + size, reference)
     saveData(f"datapool/{filename}.json", data)
 
 # -- Structured Data
@@ -101,19 +358,21 @@ def genAddr(idx: int) -> dict:
         "city": cities[city_num]
     }
 
-def genBirthday(age: int, idx: int) -> datetime:
+def genBirthday(age: int, idx: int, reference: datetime = None) -> datetime:
     """
     birthday = now - age - idx%256 days
+
+    reference replaces now for reproducible output
     """
     days = idx & 255
 
-    birthdate = datetime.now()\
+    birthdate = (reference or datetime.now())\
             - relativedelta(years=age)\
             - relativedelta(days=days)
 
     return birthdate
 
-def createStructured(idx: int) -> dict:
+def createStructured(idx: int, reference: datetime = None) -> dict:
     """
     Mimics the data found for a user of a webservice.
 
@@ -130,7 +389,7 @@ def createStructured(idx: int) -> dict:
     """
     age = (idx & 127) + 8
     first, last = genName(idx)
-    birthday = genBirthday(age, idx)
+    birthday = genBirthday(age, idx, reference)
 
     return {
         "uid": idx,
@@ -141,6 +400,110 @@ def createStructured(idx: int) -> dict:
         "birthday": birthday.strftime("%d-%m-%Y"),
     }
 
+def structuredColumns(start: int, stop: int, reference: datetime = None) -> dict:
+    '''
+    Columns of createStructured for [start, stop) computed with numpy in
+    one shot: name letters by a vectorized radix change, address by lookup
+    tables and birthdays by date math against a single reference date.
+    '''
+    reference = reference or datetime.now()
+    idx = np.arange(start, stop, dtype=np.int64)
+    size = len(idx)
+
+    age = (idx & 127) + 8
+
+    # -- names: intToStr on the whole column, one letter per pass
+    q = idx + 12_356_630
+    letters = np.zeros((size, 16), dtype=np.uint8)
+    length = np.zeros(size, dtype=np.int64)
+    alive = np.ones(size, dtype=bool)
+    pos = 0
+    while alive.any():
+        q, r = np.divmod(q, 26)
+        letters[alive, pos] = 65 + r[alive]
+        length += alive
+        alive &= q != 0
+        q -= 1
+        pos += 1
+
+    # title case (first letter upper, rest lower) and lower case for the email
+    lower = letters + 32
+    names = {key: np.empty(size, dtype=object) for key in ["first", "last", "first_lower", "last_lower"]}
+    for n in np.unique(length):
+        rows = length == n
+        split = n // 2
+        for key, lo, hi in [("first", 0, split), ("last", split, n)]:
+            chunk = np.ascontiguousarray(lower[rows, lo:hi])
+            names[f"{key}_lower"][rows] = chunk.view(f"S{hi - lo}").ravel().astype(str)
+            chunk[:, 0] -= 32
+            names[key][rows] = chunk.view(f"S{hi - lo}").ravel().astype(str)
+
+    # -- address
+    q, street_num = np.divmod(idx, 131072)
+    q, quad_num = np.divmod(q, 4)
+    city_num = q & 15
+
+    # -- birthday: relativedelta(years=age) keeps month/day and clamps to
+    # the end of the month (29 Feb), then the idx%256 days are removed
+    year = reference.year - age
+    month_start = ((year - 1970) * 12 + reference.month - 1).astype("M8[M]")
+    month_days = ((month_start + 1).astype("M8[D]") - month_start.astype("M8[D]")).astype(np.int64)
+    day = np.minimum(reference.day, month_days)
+    birthday = month_start.astype("M8[D]") + (day - 1) - (idx & 255)
+
+    birth_month = birthday.astype("M8[M]")
+    birth_day = (birthday - birth_month.astype("M8[D]")).astype(np.int64)
+
+    # zero padded day and month strings by lookup
+    padded = np.array([f"{i:02d}" for i in range(1, 32)], dtype=object)
+
+    return {
+        "uid": idx,
+        "age": age,
+        **names,
+        "street_num": street_num,
+        "quadrant": np.array(quadrant, dtype=object)[quad_num],
+        "city": np.array(cities, dtype=object)[city_num],
+        "birth_day": padded[birth_day],
+        "birth_month": padded[birth_month.astype(np.int64) % 12],
+        "birth_year": birthday.astype("M8[Y]").astype(np.int64) + 1970,
+    }
+
+def createStructuredBatch(start: int, stop: int, reference: datetime = None) -> list:
+    '''
+    createStructured for a range of indexes, the rows are only assembled
+    into dicts from the columns at the end
+    '''
+    cols = structuredColumns(start, stop, reference)
+    keys = [
+        "uid", "age", "first", "last", "first_lower", "last_lower",
+        "street_num", "quadrant", "city", "birth_day", "birth_month", "birth_year"
+    ]
+
+    # millions of new dicts trigger the cycle collector over and over,
+    # none of them can be part of a cycle so pause it while building rows
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return [
+            {
+                "uid": uid,
+                "age": age,
+                "name": f"{first} {last}",
+                "email": f"{first_lower}.{last_lower}{year}@mail.com",
+                "address": {
+                    "street": f"{street_num} Street {quad}",
+                    "city": city
+                },
+                "birthday": f"{day}-{month}-{year}",
+            }
+            for uid, age, first, last, first_lower, last_lower, street_num, quad, city, day, month, year
+            in zip(*(cols[k].tolist() for k in keys))
+        ]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
 # -- Unstructured Data
 words = [
     'ex', 'elit', 'commodo', 'ipsum', 'aute', 'nisi', 'aliquip', 'occaecat', 'sunt',
@@ -165,7 +528,7 @@ def genComments(idx: int, num: int) -> list:
     
     return comments
 
-def createUnstructured(idx: int) -> dict:
+def createUnstructured(idx: int, reference: datetime = None) -> dict:
     data = {}
 
     # generate id
@@ -184,7 +547,8 @@ def createUnstructured(idx: int) -> dict:
     
     # generate image
     if random.randint(0, 3):
-        data["image"] = uuid.uuid4().hex[:12] + ".jpg"
+        # 12 random hex characters, drawn from random so seeds reproduce it
+        data["image"] = f"{random.getrandbits(48):012x}.jpg"
     
     # generate likes
     if random.randint(0, 10):
@@ -192,19 +556,42 @@ def createUnstructured(idx: int) -> dict:
 
     # generate timestamp
     if random.randint(0, 10):
-        data["timestamp"] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        data["timestamp"] = (reference or datetime.now()).strftime("%d-%m-%Y %H:%M:%S")
 
     return data
 
+# batch versions used by generateRange when numpy is available
+BATCH_GENERATORS = {
+    createStructured: createStructuredBatch,
+}
+
 # -- Run
 if __name__ == "__main__":
-    random.seed(0)
+    parser = argparse.ArgumentParser(description="generate the benchmark datasets")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json")
+    parser.add_argument("--compress", choices=["gz", "zst"], default=None)
+    parser.add_argument("--limit", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None, help="sharded ndjson generation on N processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", type=datetime.fromisoformat, default=None,
+                        help="date used as now, e.g. 2025-01-01, for byte-identical output")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    options = {
+        "fmt": args.format,
+        "compression": args.compress,
+        "workers": args.workers,
+        "seed": args.seed,
+        "reference": args.reference,
+    }
 
     # generate 10 -> 1 million data sets for structured and unstructured
-    bulkGenerate(createStructured, "structured/data", 1_000_000)
-    bulkGenerate(createUnstructured, "unstructured/data", 1_000_000)
+    bulkGenerate(createStructured, "structured/data", args.limit, **options)
+    bulkGenerate(createUnstructured, "unstructured/data", args.limit, **options)
 
 
     # create data that indexes from 1_000_000
-    createPoolData(createStructured, "structured", 100_000)
-    createPoolData(createUnstructured, "unstructured", 100_000)
+    createPoolData(createStructured, "structured", 100_000, **options)
+    createPoolData(createUnstructured, "unstructured", 100_000, **options)
@@ -0,0 +1,91 @@
+from indexes import applyIndexProfile
+from pymongo.database import Database
+
+# queries that leave the collection as they found it
+READ_ONLY = {
+    "readOneStruct", "readManyStruct", "aggregateStruct", "aggregationStresser", "scanStruct",
+    "readOneUnstruct", "readManyUnstruct", "aggregateUnstruct", "scanUnstruct",
+}
+
+class Fixture:
+    '''
+    Keeps a pristine template copy of a dataset on the server and restores
+    the working collection from it instead of dropping and re-inserting
+    the data from the client.
+
+    method "out": the template is cloned over the working collection with
+    an aggregate $out, which swaps the collection atomically and keeps its
+    indexes
+    method "rename": a spare clone is built ahead of time (prepare) and
+    renamed over the working collection, so the measured restore is only
+    the rename
+
+    index_profile is built on the working collection (and on every spare)
+    outside the measurements
+    '''
+
+    def __init__(
+            self,
+            db: Database,
+            col_name: str,
+            data: list,
+            method: str = "out",
+            index_profile: str = "none"
+        ):
+        if method not in ["out", "rename"]:
+            raise TypeError("invalid fixture method")
+
+        self.db = db
+        self.col_name = col_name
+        self.template = f"{col_name}_template"
+        self.spare = f"{col_name}_spare"
+        self.method = method
+        self.index_profile = index_profile
+
+        # built once per dataset
+        db.drop_collection(self.template)
+        db.drop_collection(self.spare)
+        db[self.template].insert_many(data)
+
+        # first working copy with its indexes, $out keeps them from now on
+        self.clone(col_name)
+        applyIndexProfile(db[col_name], index_profile)
+        self.dirty = False
+        self.prepare()
+
+    def clone(self, target: str):
+        '''
+        Server side copy of the template into target
+        '''
+        self.db[self.template].aggregate([{"$match": {}}, {"$out": target}])
+
+    def prepare(self):
+        '''
+        Work that is kept out of the measurements: the spare for "rename"
+        '''
+        if self.method == "rename" and self.spare not in self.db.list_collection_names():
+            self.clone(self.spare)
+            applyIndexProfile(self.db[self.spare], self.index_profile)
+
+    def restore(self):
+        '''
+        Resets the working collection to the template
+        '''
+        if self.method == "rename":
+            self.prepare()
+            self.db[self.spare].rename(self.col_name, dropTarget=True)
+        else:
+            self.clone(self.col_name)
+
+        self.dirty = False
+
+    def used(self, fn: callable):
+        '''
+        Marks the working collection dirty after a query that writes
+        '''
+        if fn.__name__ not in READ_ONLY:
+            self.dirty = True
+
+    def drop(self):
+        for name in [self.template, self.spare]:
+            self.db.drop_collection(name)
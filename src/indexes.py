@@ -0,0 +1,29 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+
+# index profiles of the run matrix, _id is always there
+INDEX_PROFILES = {
+    "none": [],
+    "uid": [
+        IndexModel([("uid", ASCENDING)]),
+    ],
+    "uid_city_age": [
+        IndexModel([("uid", ASCENDING)]),
+        IndexModel([("address.city", ASCENDING)]),
+        IndexModel([("age", ASCENDING)]),
+    ],
+    "likes_partial": [
+        IndexModel([("likes", ASCENDING)], partialFilterExpression={"likes": {"$exists": True}}),
+    ],
+}
+
+def applyIndexProfile(col: Collection, profile: str):
+    '''
+    Replaces the secondary indexes of a collection with the profile's
+    '''
+    if profile not in INDEX_PROFILES:
+        raise TypeError("invalid index profile")
+
+    col.drop_indexes()
+    if INDEX_PROFILES[profile]:
+        col.create_indexes(INDEX_PROFILES[profile])
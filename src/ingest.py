@@ -0,0 +1,165 @@
+from dataGen import findData, loadData
+from concerns import WRITE_CONCERNS
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+import bson
+from bson import ObjectId
+from pymongo import MongoClient
+
+MiB = 1024**2
+
+# seconds a w0 run waits for the server to apply its writes
+W0_TIMEOUT = 60
+
+def ingest(col, docs: list, batch_size: int, ordered: bool, threads: int):
+    '''
+    Inserts docs in batches of batch_size, the batches are shared by
+    threads writer threads that each take the next free batch
+    '''
+    batches = iter(range(0, len(docs), batch_size))
+    lock = threading.Lock()
+
+    def writer():
+        while True:
+            with lock:
+                start = next(batches, None)
+            if start is None:
+                return
+            col.insert_many(docs[start:start + batch_size], ordered=ordered)
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+def measureIngest(
+        client: MongoClient,
+        db_name: str,
+        docs: list,
+        nbytes: int,
+        batch_size: int,
+        ordered: bool,
+        threads: int,
+        concern: str
+    ) -> dict:
+    '''
+    Times one ingest configuration into an empty collection
+    '''
+    col_name = "ingest_bench"
+    client[db_name].drop_collection(col_name)
+    col = client[db_name].get_collection(col_name, write_concern=WRITE_CONCERNS[concern])
+
+    time_0 = time.perf_counter()
+    ingest(col, docs, batch_size, ordered, threads)
+
+    # w0 returns before the server applied the writes, wait for them
+    if concern == "w0":
+        deadline = time_0 + W0_TIMEOUT
+        while client[db_name][col_name].estimated_document_count() < len(docs):
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"w0 writes not applied after {W0_TIMEOUT}s")
+            time.sleep(0.001)
+
+    elapsed = time.perf_counter() - time_0
+
+    return {
+        "docs": len(docs),
+        "batch_size": batch_size,
+        "ordered": ordered,
+        "threads": threads,
+        "write_concern": concern,
+        "time": elapsed,
+        "docs_per_sec": len(docs) / elapsed,
+        "mb_per_sec": nbytes / MiB / elapsed,
+    }
+
+def sweepIngest(
+        client: MongoClient,
+        db_name: str,
+        sizes: list,
+        batch_sizes: list,
+        threads: list,
+        concerns: list,
+        iterations: int = 3
+    ) -> dict:
+    '''
+    Runs every (batch size, ordered, threads, write concern) configuration
+    for each dataset size taken from the datapool, and recommends the
+    configuration with the best mean docs/sec per size
+    '''
+    print(f"Opening datapool {db_name}...")
+    pool = loadData(findData(f"datapool/{db_name}"))
+
+    # insert_many would add the _ids in place during the first timed run
+    # only, every run sends the same ids into a fresh collection instead
+    for doc in pool:
+        doc.setdefault("_id", ObjectId())
+
+    results = []
+    recommended = {}
+    for size in sizes:
+        docs = pool[:size]
+        # with the _ids, as they are sent
+        nbytes = sum(len(bson.encode(d)) for d in docs)
+
+        # batches larger than the dataset are all the same configuration
+        size_batches = sorted({min(b, size) for b in batch_sizes})
+
+        best = None
+        for batch_size, ordered, n, concern in itertools.product(size_batches, [True, False], threads, concerns):
+            runs = []
+            for i in range(iterations):
+                print(f"Running ingest {size}-batch:{batch_size}-ordered:{ordered}-threads:{n}-{concern}-iteration:{i}")
+                runs.append(measureIngest(client, db_name, docs, nbytes, batch_size, ordered, n, concern))
+
+            config = {
+                **{k: runs[0][k] for k in ["docs", "batch_size", "ordered", "threads", "write_concern"]},
+                "docs_per_sec": sum(r["docs_per_sec"] for r in runs) / iterations,
+                "mb_per_sec": sum(r["mb_per_sec"] for r in runs) / iterations,
+                "runs": runs,
+            }
+            results.append(config)
+
+            if best is None or config["docs_per_sec"] > best["docs_per_sec"]:
+                best = config
+
+        recommended[size] = {k: v for k, v in best.items() if k != "runs"}
+        print(f"Recommended for {size}: {recommended[size]}")
+
+    client[db_name].drop_collection("ingest_bench")
+
+    report = {"results": results, "recommended": recommended}
+
+    os.makedirs("logs/ingest", exist_ok=True)
+    with open(f"logs/ingest/ingest_{db_name}.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+    return report
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="insert_many tuning sweep against the datapool")
+    parser.add_argument("db_name", choices=["structured", "unstructured"])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--batch-sizes", default="100,1000,10000,100000")
+    parser.add_argument("--threads", default="1,2,4,8")
+    parser.add_argument("--concerns", default="w1,w0,j", help=f"any of {','.join(WRITE_CONCERNS)}")
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    client = MongoClient("mongodb://localhost:27017/")
+
+    sweepIngest(
+        client,
+        args.db_name,
+        [int(x) for x in args.sizes.split(",")],
+        [int(x) for x in args.batch_sizes.split(",")],
+        [int(x) for x in args.threads.split(",")],
+        args.concerns.split(","),
+        args.iterations
+    )
@@ -0,0 +1,239 @@
+from monitor import MONITOR_COMMENT
+from contextlib import contextmanager
+import threading
+import time
+import bson
+from pymongo import monitoring
+from pymongo.database import Database
+
+# commands the server can explain
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# fields the driver adds that explain does not accept
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "writeConcern"}
+
+class CommandRecorder(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    '''
+    Command and connection pool listener that keeps the commands sent while
+    recording is on, and a timeline of them (see timeline()).
+    Pass it to MongoClient(event_listeners=[RECORDER]).
+
+    The monitor's own serverStatus/$collStats commands are skipped.
+
+    sizes: also log the BSON size of every request and reply. The sizes
+    are encoded in the driver callback, inside the timed call, so they
+    add to the measured response time (a 100k document insert_many takes
+    ~0.2 s to encode) and are off by default.
+    '''
+
+    def __init__(self, sizes: bool = False):
+        self.sizes = sizes
+        self.lock = threading.Lock()
+        self.commands = None
+        self.entries = []
+        self.origin = 0
+        self.kept = set()
+        # time spent in the listener
+        self.recorder_time = 0
+        # connection wait of the last checkout per thread, the command
+        # started next on that thread is the one that waited
+        self.waits = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        wait = self.waits.pop(threading.get_ident(), None)
+        if self.commands is None or event.command.get("comment") == MONITOR_COMMENT:
+            return
+
+        time_0 = time.perf_counter()
+        size = bsonSize(event.command) if self.sizes else None
+        with self.lock:
+            # explain only needs the first command of a kind, the later ones
+            # are not kept so repeated queries do not hold every request
+            command = event.command if event.command_name not in self.kept else None
+            self.kept.add(event.command_name)
+            self.commands.append((event.command_name, command))
+            self.entries.append({
+                "request_id": event.request_id,
+                "command": event.command_name,
+                "start": time_0 - self.origin,
+                "duration": None,
+                "connection_wait": wait,
+                "request_bytes": size,
+                "reply_bytes": None,
+                "failure": None,
+            })
+            self.recorder_time += time.perf_counter() - time_0
+
+    def finished(self, event, time_0: float, reply_bytes: int = None, failure: dict = None):
+        with self.lock:
+            for entry in reversed(self.entries):
+                if entry["request_id"] == event.request_id:
+                    entry["duration"] = event.duration_micros / 1e6
+                    entry["reply_bytes"] = reply_bytes
+                    entry["failure"] = failure
+                    break
+            self.recorder_time += time.perf_counter() - time_0
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        if self.commands is None:
+            return
+        time_0 = time.perf_counter()
+        self.finished(event, time_0, reply_bytes=bsonSize(event.reply) if self.sizes else None)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        if self.commands is None:
+            return
+        time_0 = time.perf_counter()
+        failure = {"code": event.failure.get("code"), "errmsg": event.failure.get("errmsg")}
+        self.finished(event, time_0, failure=failure)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent):
+        if self.commands is not None:
+            self.waits[threading.get_ident()] = event.duration
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent):
+        self.waits.pop(threading.get_ident(), None)
+
+    # the rest of the pool events are not needed
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    @contextmanager
+    def recording(self):
+        '''
+        Yields the list the commands sent inside the block are appended to,
+        as (name, command). Only the first command of every name is kept,
+        the later ones are (name, None).
+        '''
+        self.commands = []
+        self.entries = []
+        self.kept = set()
+        self.waits = {}
+        self.recorder_time = 0
+        self.origin = time.perf_counter()
+        try:
+            yield self.commands
+        finally:
+            self.commands = None
+
+    def timeline(self) -> list:
+        '''
+        Commands of the last recording in the order they were sent: name,
+        start (s from the start of the recording), duration (s, the driver's
+        round trip: network and server execution), connection_wait (s, pool
+        checkout before the command, None if the connection was already
+        checked out) and, with sizes on, the BSON sizes of the request and
+        the reply (None otherwise).
+
+        The sizes are encoded in the listener, so the documents are not
+        held until the end of the recording. The listener's time is kept
+        in recorder_time and left out of the client overhead, it is still
+        part of the response time.
+        '''
+        return [{k: v for k, v in entry.items() if k != "request_id"} for entry in self.entries]
+
+RECORDER = CommandRecorder()
+
+def bsonSize(document: dict) -> int:
+    if document is None:
+        return None
+    try:
+        return len(bson.encode(document))
+    except (bson.errors.BSONError, TypeError):
+        return None
+
+def clientOverhead(response_time: float, timeline: list, calls: int = 1, recorder_time: float = 0) -> dict:
+    '''
+    Splits the response time of a call into the time the commands spent on
+    the wire and the server (command_time) and the rest, spent in the
+    client: BSON encoding/decoding, pool checkout and the query's own
+    python (client_overhead). calls: the calls the timeline covers,
+    recorder_time: the recorder's own time over them, part of the response
+    time but not client overhead.
+    '''
+    command_time = sum(entry["duration"] or 0 for entry in timeline) / calls
+    wait_time = sum(entry["connection_wait"] or 0 for entry in timeline) / calls
+
+    return {
+        "round_trips": len(timeline) / calls,
+        "command_time": command_time,
+        "connection_wait": wait_time,
+        "recorder_time": recorder_time / calls,
+        "client_overhead": response_time - command_time - recorder_time / calls,
+    }
+
+def planStages(plan: dict) -> str:
+    '''
+    Winning plan as a chain of stages, e.g. FETCH <- IXSCAN
+    '''
+    stages = []
+    while plan:
+        # slot based engine plans wrap the classic plan
+        plan = plan.get("queryPlan", plan)
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+
+    return " <- ".join(stages)
+
+def explainCommands(db: Database, commands: list) -> list:
+    '''
+    Runs explain("executionStats") for the first command of every
+    explainable kind that was recorded, and keeps the plan and the
+    documents/keys examined.
+
+    Explain runs after the query, so for writes it describes the plan on
+    the collection the query left behind. Explaining a write does not
+    modify the data.
+    '''
+    results = []
+    seen = set()
+    for name, command in commands:
+        if name not in EXPLAINABLE or name in seen:
+            continue
+        seen.add(name)
+
+        command = {k: v for k, v in command.items() if k not in DRIVER_FIELDS}
+        explain = db.command({"explain": command, "verbosity": "executionStats"})
+
+        # aggregate explains nest the find stage under $cursor
+        query = explain
+        if "stages" in explain:
+            query = explain["stages"][0].get("$cursor", {})
+
+        stats = query.get("executionStats", {})
+        planner = query.get("queryPlanner", {})
+
+        results.append({
+            "command": name,
+            "plan_stage": planStages(planner.get("winningPlan", {})),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "execution_ms": stats.get("executionTimeMillis"),
+        })
+
+    return results
@@ -0,0 +1,212 @@
+from monitor import MONITOR_COMMENT
+import random
+import threading
+from pymongo.database import Database
+
+KEY_DISTRIBUTIONS = ("middle", "uniform", "zipfian", "latest", "hotspot")
+
+class KeySpace:
+    '''
+    uid range of a dataset, computed once when the dataset is loaded
+    instead of counting the collection in every query
+    '''
+
+    def __init__(self, lo: int, hi: int, count: int):
+        self.lo = lo
+        self.hi = hi
+        self.count = count
+        self.lock = threading.Lock()
+
+    def append(self) -> int:
+        '''
+        uid of a new record past the end of the range, the range grows by it
+        '''
+        with self.lock:
+            self.hi += 1
+            self.count += 1
+            return self.hi
+
+    @classmethod
+    def fromData(cls, data: list) -> "KeySpace":
+        # a BSON cache keeps the range in its index, reading doc["uid"]
+        # would decode every RawBSONDocument
+        uid_range = getattr(data, "uid_range", None)
+        if uid_range is not None:
+            return cls(*uid_range)
+
+        uids = [doc["uid"] for doc in data if "uid" in doc]
+        return cls(min(uids), max(uids), len(uids))
+
+    @classmethod
+    def fromServer(cls, db: Database, col_name: str) -> "KeySpace":
+        col = db[col_name]
+        query = {"uid": {"$exists": True}}
+        count = col.count_documents(query, comment=MONITOR_COMMENT)
+        lo = col.find_one(query, {"uid": 1}, sort=[("uid", 1)], comment=MONITOR_COMMENT)
+        hi = col.find_one(query, {"uid": 1}, sort=[("uid", -1)], comment=MONITOR_COMMENT)
+        return cls(lo["uid"], hi["uid"], count)
+
+    def toJson(self) -> dict:
+        return {"lo": self.lo, "hi": self.hi, "count": self.count}
+
+# zeta(n, theta) of the zipfian generator, O(n) so kept per key space size,
+# and the largest n computed per theta
+zetas = {}
+zeta_top = {}
+
+def zeta(n: int, theta: float) -> float:
+    if (n, theta) not in zetas:
+        # a key space grown by inserts extends the largest sum so far
+        top = zeta_top.get(theta, 0)
+        if top < n:
+            zetas[(n, theta)] = zetas.get((top, theta), 0) + sum(1 / (i + 1) ** theta for i in range(top, n))
+            zeta_top[theta] = n
+        else:
+            zetas[(n, theta)] = sum(1 / (i + 1) ** theta for i in range(n))
+    return zetas[(n, theta)]
+
+def fnv64(value: int) -> int:
+    '''
+    FNV-1a of the 8 bytes of value, scatters the zipfian ranks (as YCSB)
+    '''
+    h = 0xCBF29CE484222325
+    for _ in range(8):
+        h ^= value & 0xFF
+        h = (h * 0x100000001B3) & 0xFFFFFFFFFFFFFFFF
+        value >>= 8
+    return h
+
+class KeyChooser:
+    '''
+    Picks the uid of the next single document query in a key space.
+
+    middle: the middle uid every time (the original behaviour)
+    uniform: every uid equally likely
+    zipfian: YCSB's scrambled zipfian, a few popular uids spread over the
+    range (theta 0.99)
+    latest: zipfian skewed to the highest (most recently generated) uids
+    hotspot: hot_ops of the operations go to the first hot_set of the range
+    '''
+
+    def __init__(
+            self,
+            distribution: str = "middle",
+            seed: int = None,
+            theta: float = 0.99,
+            hot_set: float = 0.2,
+            hot_ops: float = 0.8
+        ):
+        if distribution not in KEY_DISTRIBUTIONS:
+            raise TypeError("invalid key distribution")
+
+        self.distribution = distribution
+        self.seed = seed
+        self.theta = theta
+        self.hot_set = hot_set
+        self.hot_ops = hot_ops
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def prepare(self, space: KeySpace):
+        '''
+        Computes the zeta of a key space ahead of the measurements
+        '''
+        if self.distribution in ["zipfian", "latest"]:
+            zeta(space.hi - space.lo + 1, self.theta)
+
+    def zipfRank(self, n: int) -> int:
+        '''
+        Rank in [0, n) of the Gray et al. zipfian generator used by YCSB
+        '''
+        theta = self.theta
+        zetan = zeta(n, theta)
+        eta = (1 - (2 / n) ** (1 - theta)) / (1 - zeta(2, theta) / zetan)
+
+        u = self.rng.random()
+        uz = u * zetan
+        if uz < 1:
+            return 0
+        if uz < 1 + 0.5 ** theta:
+            return 1
+        return min(int(n * (eta * u - eta + 1) ** (1 / (1 - theta))), n - 1)
+
+    def choose(self, space: KeySpace) -> int:
+        n = space.hi - space.lo + 1
+        if self.distribution == "middle" or n < 2:
+            return space.lo + space.count // 2
+
+        with self.lock:
+            if self.distribution == "uniform":
+                return space.lo + self.rng.randrange(n)
+            if self.distribution == "zipfian":
+                return space.lo + fnv64(self.zipfRank(n)) % n
+            if self.distribution == "latest":
+                return space.hi - self.zipfRank(n)
+
+            hot = max(1, int(n * self.hot_set))
+            if self.rng.random() < self.hot_ops or hot == n:
+                return space.lo + self.rng.randrange(hot)
+            return space.lo + hot + self.rng.randrange(n - hot)
+
+    def toJson(self) -> dict:
+        return {
+            "distribution": self.distribution,
+            "seed": self.seed,
+            "theta": self.theta,
+            "hot_set": self.hot_set,
+            "hot_ops": self.hot_ops,
+        }
+
+# key spaces by (database name, collection name)
+key_spaces = {}
+
+# distribution the queries pick their uids from
+key_chooser = KeyChooser()
+
+def registerKeys(db_name: str, col_name: str, data: list) -> KeySpace:
+    '''
+    Computes the key space of a dataset once, before it is measured
+    '''
+    space = key_spaces[(db_name, col_name)] = KeySpace.fromData(data)
+    key_chooser.prepare(space)
+    return space
+
+def setDistribution(distribution: str, seed: int = None, **kwargv) -> KeyChooser:
+    global key_chooser
+    key_chooser = KeyChooser(distribution, seed, **kwargv)
+    for space in key_spaces.values():
+        key_chooser.prepare(space)
+    return key_chooser
+
+def keySpace(db, col_name: str) -> KeySpace:
+    '''
+    Key space of a collection. A collection that was not registered is
+    described by the server once (sync only).
+    '''
+    space = key_spaces.get((db.name, col_name))
+    if space is None:
+        if not isinstance(db, Database):
+            raise LookupError(f"no key space registered for {db.name}.{col_name}")
+        space = key_spaces[(db.name, col_name)] = KeySpace.fromServer(db, col_name)
+
+    return space
+
+def chooserJson() -> dict:
+    '''
+    Settings of the current key chooser (setDistribution rebinds it)
+    '''
+    return key_chooser.toJson()
+
+def nextKey(db, col_name: str) -> int:
+    '''
+    uid for the next single document query on a collection
+    '''
+    return key_chooser.choose(keySpace(db, col_name))
+
+def newKey(db, col_name: str) -> int:
+    '''
+    uid for a new record of a collection, past its key space. The space
+    grows by it, so "latest" reads the records inserted last (YCSB D).
+    The range stays grown until the dataset is registered again.
+    '''
+    return keySpace(db, col_name).append()
@@ -0,0 +1,269 @@
+from monitor import LatencyHistogram
+import queries
+from queries import updateDataPool, deleteCol, createCol, prepareCall
+from dataGen import loadData
+from keys import KEY_DISTRIBUTIONS, chooserJson, registerKeys, setDistribution
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+URI = "mongodb://localhost:27017/"
+
+# share of failed operations above which a load level is not reported as
+# a measurement
+MAX_ERROR_RATE = 0.01
+
+# -- Workers
+def workerLoop(fn: callable, db, col_name: str, duration: float, rate: float = None) -> dict:
+    '''
+    Repeatedly calls fn(db, col_name) until the duration has passed.
+
+    closed loop (rate=None): the next call starts as soon as the previous returns
+    open loop (rate=ops/sec): calls are scheduled at a fixed cadence and the
+    latency is measured from the scheduled start, so a stalled server also
+    counts the time requests spent waiting to be sent
+    '''
+    histogram = LatencyHistogram()
+    errors = {}
+
+    interval = int(1e9 / rate) if rate else None
+    start = time.perf_counter_ns()
+    stop_at = start + int(duration * 1e9)
+    next_start = start
+
+    while True:
+        # fresh insert-many documents, before the call is timed
+        prep_0 = time.perf_counter_ns()
+        prepareCall(fn)
+
+        now = time.perf_counter_ns()
+        if now >= stop_at:
+            break
+
+        if interval:
+            # the copy is not part of the latency, a slot it made late
+            # moves by the copy time
+            if next_start < now:
+                next_start += min(now - prep_0, now - next_start)
+
+            # wait for the next slot
+            if next_start > now:
+                time.sleep((next_start - now) / 1e9)
+            time_0 = next_start
+            next_start += interval
+        else:
+            time_0 = time.perf_counter_ns()
+
+        try:
+            fn(db, col_name)
+        except PyMongoError as e:
+            name = type(e).__name__
+            errors[name] = errors.get(name, 0) + 1
+            continue
+
+        histogram.record(time.perf_counter_ns() - time_0)
+
+    return {
+        "histogram": histogram,
+        "errors": errors,
+        "elapsed": (time.perf_counter_ns() - start) / 1e9,
+    }
+
+def processWorker(args: tuple) -> dict:
+    '''
+    Entry point for process workers, every process opens its own client
+    '''
+    fn_name, db_name, col_name, duration, rate, distribution = args
+
+    # spawned processes do not inherit the data pool, forked ones would
+    # share the key chooser's random state
+    if not queries.data_pool:
+        updateDataPool()
+    setDistribution(**{**distribution, "seed": None})
+
+    client = MongoClient(URI)
+    try:
+        return workerLoop(getattr(queries, fn_name), client[db_name], col_name, duration, rate)
+    finally:
+        client.close()
+
+# -- Load
+def runLoad(
+        client: MongoClient,
+        fn_name: str,
+        db_name: str,
+        col_name: str,
+        workers: int,
+        duration: float = 10,
+        target_ops: float = None,
+        mode: str = "thread",
+        shared_client: bool = True
+    ) -> dict:
+    '''
+    Runs fn_name from N workers at the same time and reports the throughput,
+    error counts and latency percentiles.
+
+    mode: "thread" or "process"
+    shared_client: threads share one connection pool, otherwise each thread
+    opens its own client (processes always open their own)
+    target_ops: total ops/sec spread over the workers (open loop), None
+    runs every worker in a closed loop
+    '''
+    if mode not in ["thread", "process"]:
+        raise TypeError("invalid load mode")
+
+    rate = target_ops / workers if target_ops else None
+    fn = getattr(queries, fn_name)
+
+    if mode == "process":
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(
+                processWorker,
+                [(fn_name, db_name, col_name, duration, rate, chooserJson())] * workers
+            )
+    else:
+        results = [None] * workers
+        clients = []
+        # exceptions that are not query errors, raised once all threads joined
+        failures = []
+
+        def threadWorker(idx: int):
+            try:
+                worker_client = client
+                if not shared_client:
+                    worker_client = MongoClient(URI)
+                    clients.append(worker_client)
+                results[idx] = workerLoop(fn, worker_client[db_name], col_name, duration, rate)
+            except Exception as e:
+                failures.append(e)
+
+        threads = [threading.Thread(target=threadWorker, args=(i,)) for i in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for c in clients:
+            c.close()
+
+        if failures:
+            raise failures[0]
+
+    # combine the workers
+    histogram = LatencyHistogram()
+    errors = {}
+    for r in results:
+        histogram.merge(r["histogram"])
+        for name, count in r["errors"].items():
+            errors[name] = errors.get(name, 0) + count
+
+    elapsed = max(r["elapsed"] for r in results)
+    failed = sum(errors.values())
+
+    return {
+        "function": fn_name,
+        "mode": mode,
+        "shared_client": shared_client,
+        "workers": workers,
+        "duration": elapsed,
+        "target_ops": target_ops,
+        "ops": histogram.total,
+        "errors": errors,
+        "error_rate": failed / (histogram.total + failed) if histogram.total + failed else 0,
+        "ops_per_sec": histogram.total / elapsed,
+        "latency": histogram.summary(),
+        "histogram": histogram.toJson(),
+    }
+
+def saveLoad(reports: list, db_name: str, col_name: str, fn_name: str):
+    os.makedirs(f"logs/load/{db_name}/{col_name}", exist_ok=True)
+    with open(f"logs/load/{db_name}/{col_name}/{fn_name}_load_{col_name}.json", "w") as f:
+        json.dump(reports, f, indent=4)
+
+def sweepLoad(
+        client: MongoClient,
+        fn_name: str,
+        db_name: str,
+        path: str,
+        levels: list,
+        max_error_rate: float = MAX_ERROR_RATE,
+        **kwargv
+    ) -> list:
+    '''
+    Runs the load at each concurrency level against a fresh copy of the
+    dataset at path, and saves the reports to logs/load
+
+    A level whose error rate is above max_error_rate stops the sweep with a
+    RuntimeError after the reports so far are saved, its throughput and
+    latency would measure failed round trips instead of the query
+    '''
+    col_name = os.path.basename(path).split(".")[0]
+
+    print(f"Opening file {path}...")
+    data = loadData(path)
+    registerKeys(db_name, col_name, data)
+
+    reports = []
+    for workers in levels:
+        # start every level from the same collection state
+        deleteCol(client[db_name], col_name)
+        createCol(client[db_name], col_name, data)
+
+        print(f"Running load {col_name}-{fn_name}-workers:{workers}")
+        report = runLoad(client, fn_name, db_name, col_name, workers, **kwargv)
+        reports.append(report)
+
+        print(
+            f"{report['ops_per_sec']:.1f} ops/sec, "
+            f"{sum(report['errors'].values())} errors, "
+            f"p99 {report['latency'].get('p99', 0) * 1000:.2f} ms"
+        )
+
+        if report["error_rate"] > max_error_rate:
+            saveLoad(reports, db_name, col_name, fn_name)
+            raise RuntimeError(
+                f"{fn_name} failed {report['error_rate']:.1%} of its operations "
+                f"with {workers} workers: {report['errors']}"
+            )
+
+    saveLoad(reports, db_name, col_name, fn_name)
+
+    return reports
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="closed/open loop load generator")
+    parser.add_argument("fn", help="query function, e.g. readOneStruct")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_10000.json")
+    parser.add_argument("--workers", default="1,2,4,8,16,32,64", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--rate", type=float, default=None, help="target ops/sec (open loop)")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--client-per-worker", action="store_true")
+    parser.add_argument("--max-error-rate", type=float, default=MAX_ERROR_RATE, help="fail a level above this share of failed operations")
+    parser.add_argument("--keys", choices=KEY_DISTRIBUTIONS, default="middle", help="uid distribution of the single document queries")
+    args = parser.parse_args()
+
+    db_name = "unstructured" if args.fn.endswith("Unstruct") else "structured"
+
+    # generate the data in the data pool
+    updateDataPool()
+    setDistribution(args.keys)
+
+    # connect to mongodb
+    client = MongoClient(URI)
+
+    sweepLoad(
+        client, args.fn, db_name, args.path,
+        [int(x) for x in args.workers.split(",")],
+        duration=args.duration,
+        target_ops=args.rate,
+        mode=args.mode,
+        shared_client=not args.client_per_worker,
+        max_error_rate=args.max_error_rate
+    )
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import pickle
+import time
+
+# columns of the extracted frame, in the order the notebook uses
+COLUMNS = [
+    "machine", "db_type", "variant", "function", "operation",
+    "db_size", "test_no", "iteration", "sample", "cpu_util",
+    "disk_read", "disk_write", "disk_used", "disk_free",
+    "virtual_used", "virtual_free", "response_time",
+]
+
+SAMPLE_FIELDS = COLUMNS[COLUMNS.index("cpu_util"):COLUMNS.index("response_time")]
+
+DB_TYPES = {"structured": "Struct", "unstructured": "Unstruct"}
+
+CACHE_VERSION = 2
+
+def logInfo(path: str) -> tuple | None:
+    '''
+    (machine, db_type, variant, function, db_size, test_no, iteration) of a
+    query log, from
+    .../{test_no}{machine}/.../{db_type}/[{tags}/]data_{size}/{fn}/{fn}_iteration_{i}_data_{size}.json
+    variant is the tags folder queries.logPath puts after the database type
+    (e.g. idx_uid_keys_zipfian), "default" without one.
+    None for files that are not query logs
+    '''
+    filename = os.path.basename(path)
+    file_split = filename[:-len(".json")].split("_")
+    if len(file_split) != 5 or file_split[1] != "iteration":
+        return None
+
+    # the run folder may be root itself (e.g. logs/0medium)
+    parts = os.path.normpath(path).split(os.sep)
+    run = next((p for p in parts if p[:1].isdigit() and p[1:].isalpha()), None)
+    db_type = next((p for p in parts if p in DB_TYPES), None)
+    if run is None or db_type is None:
+        return None
+
+    # the folder after the database type is the collection unless tagged
+    variant = parts[parts.index(db_type) + 1]
+    if variant == "_".join(file_split[3:]) or variant == filename:
+        variant = "default"
+
+    return (
+        run[1:],
+        db_type,
+        variant,
+        file_split[0].removesuffix(DB_TYPES[db_type]),
+        int(file_split[4]),
+        int(run[0]),
+        int(file_split[2]),
+    )
+
+def parseLog(path: str) -> list:
+    '''
+    Rows of one log file as tuples in COLUMNS order, the baseline is
+    sample 0 of every operation. Empty or broken logs give no rows.
+    '''
+    machine, db_type, variant, function, db_size, test_no, iteration = logInfo(path)
+
+    try:
+        with open(path) as f:
+            log = json.load(f)
+    except (ValueError, OSError):
+        return []
+
+    rows = []
+    for name, result in log.items():
+        operation = name if name in ["create", "delete"] else "execute"
+        head = (machine, db_type, variant, function, operation, db_size, test_no, iteration)
+        response_time = result["response_time"]
+
+        for sample in [{**result["baseline"], "sample": 0}, *result["samples"]]:
+            rows.append((
+                *head,
+                sample["sample"],
+                *[sample.get(k) for k in SAMPLE_FIELDS],
+                response_time,
+            ))
+
+    return rows
+
+def findLogs(root: str) -> dict:
+    '''
+    {path: mtime} of every query log under root
+    '''
+    logs = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if filename.endswith(".json") and logInfo(path) is not None:
+                logs[path] = os.stat(path).st_mtime_ns
+
+    return logs
+
+def loadCache(path: str) -> dict:
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+    return cache["files"] if cache.get("version") == CACHE_VERSION else {}
+
+def loadLogs(root: str = "logs", cache_path: str = None, workers: int = None):
+    '''
+    All the query logs under root as one frame (the notebook's runExtract).
+
+    Rows are kept in a pickle cache keyed by file path and mtime, so only
+    new or changed logs are parsed, over a pool of workers processes.
+    '''
+    import pandas as pd
+
+    cache_path = cache_path or os.path.join(root, ".ingest_cache.pkl")
+    cached = loadCache(cache_path)
+    logs = findLogs(root)
+
+    files = {p: cached[p] for p, mtime in logs.items() if p in cached and cached[p][0] == mtime}
+    todo = [p for p in logs if p not in files]
+
+    if todo:
+        time_0 = time.perf_counter()
+        with ProcessPoolExecutor(workers) as pool:
+            parsed = pool.map(parseLog, todo, chunksize=64)
+            for path, rows in zip(todo, parsed):
+                files[path] = (logs[path], rows)
+        print(f"Parsed {len(todo)} logs in {time.perf_counter() - time_0:.2f}s, {len(files) - len(todo)} cached")
+
+        with open(cache_path, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "files": files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    rows = [row for _, file_rows in files.values() for row in file_rows]
+    df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    df[SAMPLE_FIELDS + ["response_time"]] = df[SAMPLE_FIELDS + ["response_time"]].astype(float)
+
+    return df
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parse the query logs into one frame")
+    parser.add_argument("root", nargs="?", default="logs")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    df = loadLogs(args.root, workers=args.workers)
+    print(f"{len(df)} rows from {df.groupby(['machine', 'test_no']).ngroups} runs")
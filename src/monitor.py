@@ -1,10 +1,61 @@
 import psutil
+from pymongo.errors import OperationFailure
 import threading
 import time
 import json
+import math
+import os
+from array import array
 
 GiB = (1024**3)
 
+# comment on the monitor's own commands so query instrumentation skips them
+MONITOR_COMMENT = "monitor"
+
+# serverStatus counters that are diffed over a measurement
+SERVER_COUNTERS = {
+    "opcounters_insert": ("opcounters", "insert"),
+    "opcounters_query": ("opcounters", "query"),
+    "opcounters_update": ("opcounters", "update"),
+    "opcounters_delete": ("opcounters", "delete"),
+    "opcounters_getmore": ("opcounters", "getmore"),
+    "opcounters_command": ("opcounters", "command"),
+    "cache_bytes_read": ("wiredTiger", "cache", "bytes read into cache"),
+    "cache_bytes_written": ("wiredTiger", "cache", "bytes written from cache"),
+    "cache_pages_read": ("wiredTiger", "cache", "pages read into cache"),
+    "cache_pages_written": ("wiredTiger", "cache", "pages written from cache"),
+    "cache_pages_evicted_modified": ("wiredTiger", "cache", "modified pages evicted"),
+    "cache_pages_evicted_unmodified": ("wiredTiger", "cache", "unmodified pages evicted"),
+    "cache_pages_evicted_app": ("wiredTiger", "cache", "pages evicted by application threads"),
+    "network_bytes_in": ("network", "bytesIn"),
+    "network_bytes_out": ("network", "bytesOut"),
+}
+
+# serverStatus gauges that are kept as they are after the measurement
+SERVER_GAUGES = {
+    "cache_bytes_current": ("wiredTiger", "cache", "bytes currently in the cache"),
+    "cache_bytes_max": ("wiredTiger", "cache", "maximum bytes configured"),
+    "cache_bytes_dirty": ("wiredTiger", "cache", "tracked dirty bytes in the cache"),
+    "tickets_read_out": ("wiredTiger", "concurrentTransactions", "read", "out"),
+    "tickets_write_out": ("wiredTiger", "concurrentTransactions", "write", "out"),
+    "tickets_read_available": ("wiredTiger", "concurrentTransactions", "read", "available"),
+    "tickets_write_available": ("wiredTiger", "concurrentTransactions", "write", "available"),
+}
+
+# $collStats counters that are diffed over a measurement
+COLL_COUNTERS = {
+    "coll_cache_bytes_read": ("storageStats", "wiredTiger", "cache", "bytes read into cache"),
+    "coll_cache_bytes_written": ("storageStats", "wiredTiger", "cache", "bytes written from cache"),
+    "coll_reads": ("latencyStats", "reads", "ops"),
+    "coll_reads_micros": ("latencyStats", "reads", "latency"),
+    "coll_writes": ("latencyStats", "writes", "ops"),
+    "coll_writes_micros": ("latencyStats", "writes", "latency"),
+    "coll_count": ("storageStats", "count"),
+    "coll_size": ("storageStats", "size"),
+    "coll_storage_size": ("storageStats", "storageSize"),
+    "coll_index_size": ("storageStats", "totalIndexSize"),
+}
+
 def systemConfig() -> str:
     '''
     Function returns a message containing system resource state
@@ -76,43 +127,521 @@ def sysSnapshot() -> dict:
         "virtual_free": virtual_free,
     }
 
-def measureFn(fn: callable, interval: float = 0.2, *argv, **kwargv) -> dict:
+def nested(doc: dict, path: tuple):
+    '''
+    doc[path[0]][path[1]]... or None when a key is missing
+    '''
+    for key in path:
+        if not isinstance(doc, dict) or key not in doc:
+            return None
+        doc = doc[key]
+
+    return doc
+
+def serverSnapshot(db, col_name: str = None) -> dict:
+    '''
+    mongod counters from serverStatus and $collStats of the collection.
+    Keys missing on this server version are left out.
+    '''
+    status = db.command("serverStatus", comment=MONITOR_COMMENT)
+    snapshot = {key: nested(status, path) for key, path in {**SERVER_COUNTERS, **SERVER_GAUGES}.items()}
+
+    # lock wait of every lock type and mode
+    snapshot["lock_wait_micros"] = sum(
+        wait
+        for lock in status.get("locks", {}).values() if isinstance(lock, dict)
+        for wait in lock.get("timeAcquiringMicros", {}).values()
+    )
+
+    if col_name is not None:
+        try:
+            stats = next(db[col_name].aggregate(
+                [{"$collStats": {"storageStats": {}, "latencyStats": {}}}],
+                comment=MONITOR_COMMENT
+            ), {})
+        except OperationFailure:
+            # the collection does not exist (e.g. right after a drop)
+            stats = {}
+
+        snapshot.update({key: nested(stats, path) for key, path in COLL_COUNTERS.items()})
+
+    return {k: v for k, v in snapshot.items() if v is not None}
+
+def diffServer(before: dict, after: dict) -> dict:
+    '''
+    Counter deltas over a measurement and the gauges after it
+    '''
+    delta = {
+        key: after[key] - before[key]
+        for key in [*SERVER_COUNTERS, *COLL_COUNTERS, "lock_wait_micros"]
+        if key in before and key in after
+    }
+    gauges = {key: after[key] for key in SERVER_GAUGES if key in after}
+
+    return {"delta": delta, "after": gauges}
+
+# mongod process once found
+mongod_process = None
+
+def findProcess(name: str = "mongod", pid: int = None):
+    '''
+    Process by pid, or the first process whose name starts with name
+    (mongod, mongod.exe). None when there is no such local process.
+    '''
+    try:
+        if pid is not None:
+            return psutil.Process(pid)
+
+        for proc in psutil.process_iter(["name"]):
+            if (proc.info["name"] or "").startswith(name):
+                return proc
+    except psutil.Error:
+        pass
+
+    return None
+
+def trackedProcesses(mongod_pid: int = None) -> dict:
+    '''
+    The processes measured separately: the benchmark itself (client) and
+    the local mongod when it can be found
+    '''
+    global mongod_process
+
+    if mongod_process is None or not mongod_process.is_running() or mongod_pid not in [None, mongod_process.pid]:
+        mongod_process = findProcess("mongod", mongod_pid)
+
+    processes = {"client": psutil.Process()}
+    if mongod_process is not None:
+        processes["mongod"] = mongod_process
+
+    return processes
+
+def procSnapshot(proc) -> dict:
+    '''
+    Resource counters of one process, fields the platform or permissions
+    do not give are left out
+    '''
+    snapshot = {}
+    with proc.oneshot():
+        readers = {
+            "cpu": lambda: proc.cpu_times(),
+            "memory": lambda: proc.memory_info(),
+            "io": lambda: proc.io_counters(),
+            "ctx": lambda: proc.num_ctx_switches(),
+        }
+        values = {}
+        for key, reader in readers.items():
+            try:
+                values[key] = reader()
+            except (psutil.Error, AttributeError, NotImplementedError):
+                pass
+
+    if "cpu" in values:
+        snapshot["cpu_user"] = values["cpu"].user
+        snapshot["cpu_sys"] = values["cpu"].system
+    if "memory" in values:
+        snapshot["rss"] = values["memory"].rss / GiB
+    if "io" in values:
+        snapshot["read_bytes"] = values["io"].read_bytes
+        snapshot["write_bytes"] = values["io"].write_bytes
+    if "ctx" in values:
+        snapshot["ctx_voluntary"] = values["ctx"].voluntary
+        snapshot["ctx_involuntary"] = values["ctx"].involuntary
+
+    return snapshot
+
+def processesSnapshot(processes: dict) -> dict:
+    snapshots = {}
+    for label, proc in processes.items():
+        try:
+            snapshots[label] = procSnapshot(proc)
+        except psutil.Error:
+            # the process ended
+            continue
+
+    return snapshots
+
+def diffProcesses(before: dict, after: dict) -> dict:
+    '''
+    Per process deltas over a measurement, rss is kept as its value after
+    '''
+    results = {}
+    for label in [x for x in before if x in after]:
+        delta = {
+            key: after[label][key] - before[label][key]
+            for key in before[label] if key in after[label] and key != "rss"
+        }
+        if "rss" in after[label]:
+            delta["rss"] = after[label]["rss"]
+        results[label] = delta
+
+    return results
+
+class LatencyHistogram:
+    '''
+    HDR-style latency histogram with bounded memory.
+
+    Values are nanoseconds. Below 2**precision every value has its own
+    bucket, above that each power of two is split into 2**(precision-1)
+    buckets so the relative error stays under 2**-(precision-1) (~1.6% at
+    the default). Values above max_ns are clamped into the last bucket.
+    '''
+
+    def __init__(self, precision: int = 7, max_ns: int = 3_600 * 10**9):
+        self.precision = precision
+        self.half = 1 << (precision - 1)
+        self.counts = [0] * (self.index(max_ns) + 1)
+        self.total = 0
+        self.sum_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    def index(self, value: int) -> int:
+        '''
+        Bucket of a value: linear below 2**precision, log-linear above
+        '''
+        shift = value.bit_length() - self.precision
+        if shift <= 0:
+            return value
+        return (self.half << 1) + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def bounds(self, idx: int) -> tuple[int, int]:
+        '''
+        Lowest and highest value that land in a bucket
+        '''
+        if idx < (self.half << 1):
+            return idx, idx
+        shift, offset = divmod(idx - (self.half << 1), self.half)
+        shift += 1
+        lower = (offset + self.half) << shift
+        return lower, lower + (1 << shift) - 1
+
+    def record(self, value: int):
+        idx = min(self.index(value), len(self.counts) - 1)
+        self.counts[idx] += 1
+        self.total += 1
+        self.sum_ns += value
+        self.max_ns = max(self.max_ns, value)
+        self.min_ns = value if self.min_ns is None else min(self.min_ns, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        for idx, count in enumerate(other.counts):
+            self.counts[idx] += count
+        self.total += other.total
+        self.sum_ns += other.sum_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        if other.min_ns is not None:
+            self.min_ns = other.min_ns if self.min_ns is None else min(self.min_ns, other.min_ns)
+
+    def percentile(self, p: float) -> int:
+        '''
+        Highest value equivalent to the nearest-rank percentile (ns)
+        '''
+        if not self.total:
+            return 0
+
+        rank = max(math.ceil(p / 100 * self.total), 1)
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds(idx)[1], self.max_ns)
+
+        return self.max_ns
+
+    def summary(self, points: tuple = (50, 90, 99, 99.9)) -> dict:
+        '''
+        Percentiles, max and mean in seconds
+        '''
+        if not self.total:
+            return {}
+
+        results = {f"p{p:g}": self.percentile(p) / 1e9 for p in points}
+        results["max"] = self.max_ns / 1e9
+        results["mean"] = self.sum_ns / self.total / 1e9
+
+        return results
+
+    def toJson(self) -> dict:
+        '''
+        Sparse form of the raw histogram: [lower_ns, upper_ns, count] per bucket
+        '''
+        return {
+            "precision": self.precision,
+            "count": self.total,
+            "min_ns": self.min_ns,
+            "max_ns": self.max_ns,
+            "buckets": [
+                [*self.bounds(idx), count]
+                for idx, count in enumerate(self.counts) if count
+            ],
+        }
+
+# cpu_times() counts in clock ticks (USER_HZ), a window shorter than a tick
+# is rounding noise and logs as NaN (unknown), not as idle
+try:
+    CPU_TICK = 1 / os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    CPU_TICK = 0.01
+
+# (perf_counter, cpu_times()) of the last reading that closed a window
+# (kept by the last sampler, or taken at import), the baseline's cpu_util
+# is measured against it instead of a blocking cpu_percent
+cpu_mark = (time.perf_counter(), psutil.cpu_times())
+
+def cpuTotal(cpu) -> float:
+    # guest time is already counted in user/nice on Linux (as in psutil)
+    return sum(cpu) - getattr(cpu, "guest", 0) - getattr(cpu, "guest_nice", 0)
+
+class Sampler:
+    '''
+    Samples the system on a fixed cadence from a background thread.
+
+    Sample times come from the monotonic clock and the next deadline is
+    always start + n * interval, so the period does not drift with the
+    cost of a sample (missed deadlines are skipped, not bunched up).
+    CPU utilisation comes from cpu_times() deltas instead of a blocking
+    cpu_percent, and every field is a preallocated array column used as
+    a ring buffer, so sampling at 10 ms allocates nothing per sample.
+    '''
+
+    fields = [
+        "timestamp", "cpu_util", "disk_read", "disk_write",
+        "disk_used", "disk_free", "virtual_used", "virtual_free",
+    ]
+
+    def __init__(self, interval: float = 0.01, capacity: int = 65_536):
+        self.interval = interval
+        self.capacity = capacity
+        self.columns = {name: array("d", bytes(8 * capacity)) for name in self.fields}
+        self.count = 0
+        self.event = threading.Event()
+        self.thread = None
+        self.start_time = None
+        self.cpu_prev_time, self.cpu_prev = cpu_mark
+
+    def cpuUtil(self) -> float:
+        '''
+        Busy share of the cpu time since the previous reading, NaN when that
+        is under a clock tick. The previous reading is then kept, so the
+        next sample covers the whole window
+        '''
+        now = time.perf_counter()
+        cpu = psutil.cpu_times()
+        total = cpuTotal(cpu) - cpuTotal(self.cpu_prev)
+        if now - self.cpu_prev_time < CPU_TICK or total <= 0:
+            return math.nan
+
+        idle = (cpu.idle + getattr(cpu, "iowait", 0)) - (self.cpu_prev.idle + getattr(self.cpu_prev, "iowait", 0))
+        self.cpu_prev_time, self.cpu_prev = now, cpu
+
+        return max(100 * (total - idle) / total, 0.0)
+
+    def sample(self):
+        idx = self.count % self.capacity
+        cols = self.columns
+
+        cols["timestamp"][idx] = time.perf_counter() - self.start_time
+        cols["cpu_util"][idx] = self.cpuUtil()
+
+        disk = psutil.disk_io_counters()
+        cols["disk_read"][idx] = disk.read_bytes/GiB
+        cols["disk_write"][idx] = disk.write_bytes/GiB
+
+        disk = psutil.disk_usage('/')
+        cols["disk_used"][idx] = disk.used/GiB
+        cols["disk_free"][idx] = disk.free/GiB
+
+        virtual = psutil.virtual_memory()
+        cols["virtual_free"][idx] = virtual.available/GiB
+        cols["virtual_used"][idx] = (virtual.total - virtual.available)/GiB
+
+        self.count += 1
+
+    def baseline(self) -> dict:
+        '''
+        One reading before the sampler starts, without the timestamp.
+        cpu_util is the utilisation since the last whole window of the
+        previous sampler (cpu_mark), NaN if that is under a clock tick
+        '''
+        self.start_time = time.perf_counter()
+        self.sample()
+        self.count = 0
+
+        return {name: self.columns[name][0] for name in self.fields if name != "timestamp"}
+
+    def run(self):
+        deadline = self.start_time
+        while True:
+            self.sample()
+
+            # next slot on the fixed grid, skipping slots already missed
+            now = time.perf_counter()
+            deadline += self.interval
+            if deadline < now:
+                deadline += math.ceil((now - deadline) / self.interval) * self.interval
+
+            if self.event.wait(deadline - now):
+                return
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stops the thread and takes a last sample so every run has the end state
+        '''
+        global cpu_mark
+
+        self.event.set()
+        self.thread.join()
+        self.sample()
+        cpu_mark = (self.cpu_prev_time, self.cpu_prev)
+
+    def toSamples(self) -> list:
+        '''
+        The samples kept in the ring buffer as dicts, oldest first
+        '''
+        first = max(self.count - self.capacity, 0)
+        return [
+            {
+                **{name: self.columns[name][n % self.capacity] for name in self.fields},
+                "sample": n + 1,
+            }
+            for n in range(first, self.count)
+        ]
+
+def measureFn(
+        fn: callable,
+        interval: float = 0.2,
+        *argv,
+        server: tuple = None,
+        processes: dict = None,
+        setup: callable = None,
+        **kwargv
+    ) -> dict:
+    '''
+    Times one call of fn while sampling the system.
+
+    server: (db, col_name) to also log the serverStatus/$collStats
+    deltas of the call under "server"
+    processes: {label: psutil.Process} whose cpu, rss, io and context
+    switch deltas over the call are logged under "processes"
+    setup: called untimed before fn, e.g. queries.prepareCall
+    '''
     results = {}
-    samples = []
-    event = threading.Event()
-
-    # function for thread to get system snapshot
-    def getSnapshots():
-        iteration = 1
-        while not event.is_set():
-            data = sysSnapshot()
-            data["sample"] = iteration
-            samples.append(data)
-            iteration += 1
-            time.sleep(interval)
-    
+
+    if setup is not None:
+        setup()
+
     # get a baseline for system readings
-    results["baseline"] = sysSnapshot()
+    sampler = Sampler(interval)
+    results["baseline"] = sampler.baseline()
+    if server is not None:
+        server_0 = serverSnapshot(*server)
+    if processes is not None:
+        processes_0 = processesSnapshot(processes)
 
     # start thread to measure performance
-    snap_thread = threading.Thread(target=getSnapshots, daemon=True)
-    snap_thread.start()
+    sampler.start()
 
-    # run function
-    time_0 = time.time()
-    fn(*argv, **kwargv)
-    time_1 = time.time()
+    # run function, the sampler stops even if it raises
+    try:
+        time_0 = time.perf_counter_ns()
+        fn(*argv, **kwargv)
+        time_1 = time.perf_counter_ns()
 
-    # stop the snapshot thread
-    event.set()
-    snap_thread.join()
+        if processes is not None:
+            processes_1 = processesSnapshot(processes)
+    finally:
+        # stop the snapshot thread
+        sampler.stop()
 
     # get the response time
-    response_time = time_1 - time_0
+    response_time = (time_1 - time_0) / 1e9
 
     # combine everything
-    results["samples"] = samples
+    results["samples"] = sampler.toSamples()
     results["response_time"] = response_time
+    if server is not None:
+        results["server"] = diffServer(server_0, serverSnapshot(*server))
+    if processes is not None:
+        results["processes"] = diffProcesses(processes_0, processes_1)
+
+    return results
+
+def measureRepeated(
+        fn: callable,
+        iterations: int = 100,
+        warmup: int = 10,
+        interval: float = 0.2,
+        *argv,
+        server: tuple = None,
+        processes: dict = None,
+        setup: callable = None,
+        **kwargv
+    ) -> dict:
+    '''
+    Calls fn warmup times untimed, then iterations times with every call
+    recorded into a LatencyHistogram.
+
+    response_time is the mean so the log reads like a measureFn result,
+    latency holds the percentiles and histogram the raw buckets
+    server: (db, col_name) for the serverStatus/$collStats deltas of the
+    timed calls
+    processes: {label: psutil.Process} for per process deltas
+    setup: called untimed before every call, e.g. queries.prepareCall
+    '''
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1")
+
+    results = {}
+    histogram = LatencyHistogram()
+
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn(*argv, **kwargv)
+
+    # get a baseline for system readings
+    sampler = Sampler(interval)
+    results["baseline"] = sampler.baseline()
+    if server is not None:
+        server_0 = serverSnapshot(*server)
+    if processes is not None:
+        processes_0 = processesSnapshot(processes)
+
+    # start thread to measure performance
+    sampler.start()
+
+    # the sampler stops even if a call raises
+    try:
+        for _ in range(iterations):
+            if setup is not None:
+                setup()
+            time_0 = time.perf_counter_ns()
+            fn(*argv, **kwargv)
+            histogram.record(time.perf_counter_ns() - time_0)
+
+        if processes is not None:
+            processes_1 = processesSnapshot(processes)
+    finally:
+        # stop the snapshot thread
+        sampler.stop()
+
+    # combine everything
+    results["samples"] = sampler.toSamples()
+    results["response_time"] = histogram.sum_ns / histogram.total / 1e9
+    results["iterations"] = iterations
+    results["warmup"] = warmup
+    results["latency"] = histogram.summary()
+    results["histogram"] = histogram.toJson()
+    if server is not None:
+        results["server"] = diffServer(server_0, serverSnapshot(*server))
+    if processes is not None:
+        results["processes"] = diffProcesses(processes_0, processes_1)
 
     return results
 
@@ -1,17 +1,77 @@
-from monitor import measureFn
-from dataGen import createStructured, genBirthday, createUnstructured
+from monitor import measureFn, measureRepeated, trackedProcesses
+from analysisStats import ciHalfWidth
+from bsonCache import BsonCache, loadCached
+from fixtures import Fixture
+from indexes import applyIndexProfile
+from instrument import RECORDER, explainCommands, clientOverhead
+from clientConfig import CLIENT_CONFIGS, makeClient
+from results import ResultStore
+from keys import chooserJson, newKey, nextKey, registerKeys, setDistribution
+from concerns import concernDatabase
+from dataGen import createStructured, genBirthday, createUnstructured, DATA_EXTENSIONS, findData, loadData
 import os
 import json
+import statistics
+import contextvars
+import functools
 from pymongo import MongoClient
 from pymongo.database import Database
 
 # -- General
 data_pool = {}
 
-def updateDataPool():
+# pools of the insert-many queries
+INSERT_POOLS = {
+    "insertManyStruct": "struct_insert_many",
+    "insertManyThenDeleteManyStruct": "struct_insert_many",
+    "insertManyUnstruct": "unstruct_insert_many",
+    "insertManyThenDeleteManyUnstruct": "unstruct_insert_many",
+}
+
+# (pool name, documents) the next insert-many call sends, per thread and
+# per asyncio task
+insert_batch = contextvars.ContextVar("insert_batch", default=None)
+
+def freshDocs(pool_name: str) -> list:
+    '''
+    Copies of an insert-many pool without _id. insert_many adds the _id to
+    the documents it is given, sending the pool itself again would reuse
+    the ids of the previous call. RawBSONDocuments are not modified (the
+    server adds the _id) so the cached pools (BsonCache) are sent as they
+    are.
+    '''
+    pool = data_pool[pool_name]
+    if isinstance(pool, BsonCache):
+        return pool
+    return [{k: v for k, v in doc.items() if k != "_id"} for doc in pool]
+
+def prepareCall(fn: callable):
+    '''
+    Untimed setup before every call of fn: the fresh documents of an
+    insert-many query
+    '''
+    pool_name = INSERT_POOLS.get(fn.__name__)
+    if pool_name is not None:
+        insert_batch.set((pool_name, freshDocs(pool_name)))
+
+def insertDocs(pool_name: str) -> list:
+    '''
+    The documents prepareCall made for this call, copied here when the
+    caller did not prepare them
+    '''
+    batch = insert_batch.get()
+    insert_batch.set(None)
+    if batch is not None and batch[0] == pool_name:
+        return batch[1]
+    return freshDocs(pool_name)
+
+def updateDataPool(cache: bool = False):
     '''
     Loads in data from the datapool into the global variable
+
+    cache: load the insert-many pools as RawBSONDocument from the BSON cache
     '''
+    load = loadCached if cache else loadData
 
     print("Collecting insertion data...")
 
@@ -19,11 +79,9 @@ def updateDataPool():
 
     data_pool["unstruct_insert_one"] = createUnstructured(1_000_000)
 
-    with open("datapool/structured.json", "r") as f:
-        data_pool["struct_insert_many"] = json.load(f)
+    data_pool["struct_insert_many"] = load(findData("datapool/structured"))
 
-    with open("datapool/unstructured.json", "r") as f:
-        data_pool["unstruct_insert_many"] = json.load(f)
+    data_pool["unstruct_insert_many"] = load(findData("datapool/unstructured"))
 
     print("Done")
 
@@ -33,11 +91,13 @@ def deleteCol(db: Database, col_name: str):
     '''
     db.drop_collection(col_name)
 
-def createCol(db: Database, col_name: str, data: list):
+def createCol(db: Database, col_name: str, data: list, index_profile: str = "none"):
     '''
-    Query to create a collection
+    Query to create a collection, with the indexes of the profile
     '''
     db[col_name].insert_many(data)
+    if index_profile != "none":
+        applyIndexProfile(db[col_name], index_profile)
 
 # -- Structured Queries
 
@@ -45,36 +105,47 @@ def insertOneStruct(db: Database, col_name: str):
     '''
     Query to insert a single document
     '''
-    db[col_name].insert_one(data_pool["struct_insert_one"])
+    # copy so repeated calls do not reuse the generated _id
+    db[col_name].insert_one(data_pool["struct_insert_one"].copy())
+
+def insertLatestStruct(db: Database, col_name: str):
+    '''
+    Query to insert a single new user, with a uid past the key space
+    '''
+    user = data_pool["struct_insert_one"].copy()
+    user["uid"] = newKey(db, col_name)
+    db[col_name].insert_one(user)
 
 def insertManyStruct(db: Database, col_name: str):
     '''
     Query to insert a large amount of data
     '''
-    db[col_name].insert_many(data_pool["struct_insert_many"])
+    db[col_name].insert_many(insertDocs("struct_insert_many"))
 
 def readOneStruct(db: Database, col_name: str):
     '''
-    Query to read a single middle data point
+    Query to read a single data point, uid from the key distribution
     '''
-    total = db[col_name].count_documents({})
-    middle_uid = total // 2
-    db[col_name].find_one({"uid": middle_uid})
+    uid = nextKey(db, col_name)
+    db[col_name].find_one({"uid": uid})
+
+# uid % 4 = 0
+read_many_struct = {"$expr": {"$eq": [{"$mod": ["$uid", 4]}, 0]}}
 
 def readManyStruct(db: Database, col_name: str):
     '''
-    Query to read all uid % 4 = 0
+    Query to read all uid % 4 = 0, the cursor is drained so every batch
+    is fetched from the server
     '''
-    db[col_name].find({"$expr": {"$eq": [{"$mod": ["$uid", 4]}, 0]}})
+    list(db[col_name].find(read_many_struct))
 
 def updateOneStruct(db: Database, col_name: str):
     '''
-    Query to update middle document age and DOB
+    Query to update a document's age and DOB
     '''
-    total = db[col_name].count_documents({})
-    middle_uid = total // 2
+    uid = nextKey(db, col_name)
     db[col_name].update_one(
-        {"uid": middle_uid},
+        {"uid": uid},
         {"$set": {"birthday": "1-1-2000", "age": 25}}
     )
 
@@ -89,14 +160,13 @@ def updateManyStruct(db: Database, col_name: str):
 
 def replaceOneStruct(db: Database, col_name: str):
     '''
-    Query to insert a new document in the middle
+    Query to replace a document with a new one
     '''
-    total = db[col_name].count_documents({})
-    middle_uid = total // 2
+    uid = nextKey(db, col_name)
     new_doc = data_pool["struct_insert_one"].copy()
     new_doc.pop("_id", None)
     db[col_name].replace_one(
-        {"uid": middle_uid},
+        {"uid": uid},
         new_doc
     )
 
@@ -105,7 +175,7 @@ def insertManyThenDeleteManyStruct(db: Database, col_name: str):
     '''
     Complex query: Insert many → Delete users with age > 60
     '''
-    db[col_name].insert_many(data_pool["struct_insert_many"])
+    db[col_name].insert_many(insertDocs("struct_insert_many"))
     db[col_name].delete_many(
         {"age": {"$gt": 60}}
     )
@@ -116,7 +186,7 @@ def insertOneThenUpdateBirthdayStruct(db: Database, col_name: str):
     Complex query: Insert one user → Update that user's birthday
     '''
     # Step 1: Insert one user
-    user = data_pool["struct_insert_one"]
+    user = data_pool["struct_insert_one"].copy()
     db[col_name].insert_one(user)
 
     # Step 2: Update that user's birthday
@@ -153,6 +223,25 @@ def aggregateStruct(db: Database, col_name: str):
     list(db[col_name].aggregate(pipeline))
 
 
+def scanStruct(db: Database, col_name: str):
+    '''
+    Query to read a short range of 100 documents from a uid
+    (YCSB scan, not part of the run matrix)
+    '''
+    uid = nextKey(db, col_name)
+    list(db[col_name].find({"uid": {"$gte": uid}}).sort("uid", 1).limit(100))
+
+def readModifyWriteStruct(db: Database, col_name: str):
+    '''
+    Reads a user then writes back its age + 1, both on the same uid
+    (YCSB read-modify-write, not part of the run matrix)
+    '''
+    uid = nextKey(db, col_name)
+    user = db[col_name].find_one({"uid": uid})
+    if user is not None:
+        db[col_name].update_one({"uid": uid}, {"$set": {"age": user["age"] + 1}})
+
+
 def aggregationStresser(db: Database, col_name: str):
     '''
     Stressful aggregation: group by city & age, compute multiple stats
@@ -198,43 +287,54 @@ def insertOneUnstruct(db: Database, col_name: str):
     '''
     Inserts one unstructured document into the collection
     '''
-    db[col_name].insert_one(data_pool["unstruct_insert_one"])
+    db[col_name].insert_one(data_pool["unstruct_insert_one"].copy())
+
+
+def insertLatestUnstruct(db: Database, col_name: str):
+    '''
+    Inserts one new unstructured document, with a uid past the key space
+    '''
+    user = data_pool["unstruct_insert_one"].copy()
+    user["uid"] = newKey(db, col_name)
+    db[col_name].insert_one(user)
 
 
 def insertManyUnstruct(db: Database, col_name: str):
     '''
     Inserts many unstructured documents into the collection
     '''
-    db[col_name].insert_many(data_pool["unstruct_insert_many"])
+    db[col_name].insert_many(insertDocs("unstruct_insert_many"))
 
 
 def readOneUnstruct(db: Database, col_name: str):
     '''
     Reads one unstructured document from the collection
     '''
-    total = db[col_name].count_documents({})
-    middle_uid = total // 2
-    db[col_name].find_one({"uid": middle_uid})
+    uid = nextKey(db, col_name)
+    db[col_name].find_one({"uid": uid})
+
 
+# uid % 4 = 0 for the documents with a uid
+read_many_unstruct = {
+    "uid": {"$exists": True},
+    "$expr": {"$eq": [{"$mod": ["$uid", 4]}, 0]}
+}
 
 def readManyUnstruct(db: Database, col_name: str):
     '''
-    Reads many unstructured documents from the collection
+    Reads many unstructured documents from the collection, the cursor is
+    drained so every batch is fetched from the server
     '''
-    db[col_name].find({
-        "uid": {"$exists": True},
-        "$expr": {"$eq": [{"$mod": ["$uid", 4]}, 0]}
-    })
+    list(db[col_name].find(read_many_unstruct))
 
 
 def updateOneUnstruct(db: Database, col_name: str):
     '''
-    Updates a middle document's timestamp and likes.
+    Updates a document's timestamp and likes.
     '''
-    total = db[col_name].count_documents({"uid": {"$exists": True}})
-    middle_uid = total // 2
+    uid = nextKey(db, col_name)
     db[col_name].update_one(
-        {"uid": middle_uid},
+        {"uid": uid},
         {"$set": {"timestamp": "01-01-2000 00:00:00", "likes": 25}}
     )
 
@@ -251,20 +351,19 @@ def updateManyUnstruct(db: Database, col_name: str):
 
 def replaceOneUnstruct(db: Database, col_name: str):
     '''
-    Replaces the middle document by uid with a new document.
+    Replaces a document by uid with a new document.
     '''
-    total = db[col_name].count_documents({"uid": {"$exists": True}})
-    middle_uid = total // 2
+    uid = nextKey(db, col_name)
     new_doc = data_pool["unstruct_insert_one"].copy()
     new_doc.pop("_id", None)
-    db[col_name].replace_one({"uid": middle_uid}, new_doc)
+    db[col_name].replace_one({"uid": uid}, new_doc)
 
 
 def insertManyThenDeleteManyUnstruct(db: Database, col_name: str):
     '''
     Complex query: Insert many documents then deletes users with likes > 60
     '''
-    db[col_name].insert_many(data_pool["unstruct_insert_many"])
+    db[col_name].insert_many(insertDocs("unstruct_insert_many"))
     db[col_name].delete_many({"likes": {"$exists": True, "$gt": 60}})
 
 
@@ -272,7 +371,7 @@ def insertOneThenUpdateTimestampUnstruct(db: Database, col_name: str):
     '''
     Inserts one document then updates the timestamp.
     '''
-    user = data_pool["unstruct_insert_one"]
+    user = data_pool["unstruct_insert_one"].copy()
     db[col_name].insert_one(user)
     new_ts = "01-01-2025 00:00:00"
     db[col_name].update_one(
@@ -301,80 +400,314 @@ def aggregateUnstruct(db: Database, col_name: str):
     ]
     list(db[col_name].aggregate(pipeline))
 
+def scanUnstruct(db: Database, col_name: str):
+    '''
+    Reads a short range of 100 documents from a uid
+    (YCSB scan, not part of the run matrix)
+    '''
+    uid = nextKey(db, col_name)
+    list(db[col_name].find({"uid": {"$gte": uid}}).sort("uid", 1).limit(100))
+
+def readModifyWriteUnstruct(db: Database, col_name: str):
+    '''
+    Reads a document then writes back its likes + 1, both on the same uid
+    (YCSB read-modify-write, not part of the run matrix)
+    '''
+    uid = nextKey(db, col_name)
+    user = db[col_name].find_one({"uid": uid})
+    if user is not None:
+        db[col_name].update_one({"uid": uid}, {"$set": {"likes": user.get("likes", 0) + 1}})
+
+# queries of the benchmark matrix per database type, in run order
+query_functions = {
+    "structured": [
+        insertOneStruct, insertManyStruct, readOneStruct, readManyStruct,
+        updateOneStruct, updateManyStruct, replaceOneStruct, insertManyThenDeleteManyStruct,
+        insertOneThenUpdateBirthdayStruct, readThenDeleteOldUsersStruct, aggregateStruct
+    ],
+    "unstructured": [
+        insertOneUnstruct, insertManyUnstruct, readOneUnstruct, readManyUnstruct,
+        updateOneUnstruct, updateManyUnstruct, replaceOneUnstruct, insertManyThenDeleteManyUnstruct,
+        insertOneThenUpdateTimestampUnstruct, readThenDeleteManyLikesUnstruct, aggregateUnstruct
+    ],
+}
+
 # -- Management Functions
 
-def collectMeasure(db: Database, col_name: str, data: list, fn: callable):
+def collectMeasure(
+        db: Database,
+        col_name: str,
+        data: list,
+        fn: callable,
+        repeat: int = 0,
+        warmup: int = 0,
+        fixture: Fixture = None,
+        index_profile: str = "none",
+        client_config: str = "default"
+    ):
     '''
     This function aggregates the measurements collected for setting up a query
+
+    repeat > 0 times the query repeat times (after warmup untimed calls) and
+    logs the latency histogram instead of a single response time
+
+    fixture: the collection is restored server side from the fixture
+    template (logged as create) and only when the last query wrote to it
+
+    the commands the query sends are explained after the measurement and
+    kept under "explain" with the index profile, every step also logs the
+    mongod serverStatus/$collStats deltas under "server" and the mongod
+    and client process deltas under "processes"
+
+    every command of the query is logged under "commands" (name, driver
+    round trip, connection wait, request/reply size if RECORDER.sizes) and
+    client_overhead is the response time minus the summed round trips and
+    the recorder's own time of one call
+
+    the query runs with the write/read concerns of db (concerns.py), the
+    collection is set up with the defaults so w:0 cannot leave it half built
     '''
     measures = {}
-    measures["delete"] = measureFn(deleteCol, 0.1, db, col_name)
-    measures["create"] = measureFn(createCol, 0.1, db, col_name, data)
-    measures[fn.__name__] = measureFn(fn, 0.1, db, col_name)
+    setup_db = db.client[db.name]
+    tracking = {"server": (db, col_name), "processes": trackedProcesses()}
+    if fixture is None:
+        measures["delete"] = measureFn(deleteCol, 0.1, setup_db, col_name, **tracking)
+        measures["create"] = measureFn(createCol, 0.1, setup_db, col_name, data, index_profile, **tracking)
+    elif fixture.dirty:
+        measures["create"] = measureFn(fixture.restore, 0.1, **tracking)
+
+    # fresh insert-many documents before every call, outside the timing
+    setup = functools.partial(prepareCall, fn)
+
+    # warm up before recording so the timeline only covers the timed calls
+    if repeat:
+        for _ in range(warmup):
+            setup()
+            fn(db, col_name)
+
+    with RECORDER.recording() as commands:
+        if repeat:
+            measures[fn.__name__] = measureRepeated(fn, repeat, 0, 0.1, db, col_name, setup=setup, **tracking)
+            measures[fn.__name__]["warmup"] = warmup
+        else:
+            measures[fn.__name__] = measureFn(fn, 0.1, db, col_name, setup=setup, **tracking)
+
+    measures[fn.__name__]["index_profile"] = index_profile
+    measures[fn.__name__]["client_config"] = client_config
+    measures[fn.__name__]["keys"] = chooserJson()
+    measures[fn.__name__]["write_concern"] = db.write_concern.document
+    measures[fn.__name__]["read_concern"] = db.read_concern.document
+    measures[fn.__name__]["explain"] = explainCommands(db, commands)
+
+    # per command timeline of the timed calls
+    timeline = RECORDER.timeline()
+    measures[fn.__name__]["commands"] = timeline
+    measures[fn.__name__].update(clientOverhead(
+        measures[fn.__name__]["response_time"], timeline, repeat or 1, RECORDER.recorder_time
+    ))
+
+    if fixture is not None:
+        fixture.used(fn)
+        fixture.prepare()
+
+    return measures
+
+
+def enoughIterations(
+        response_times: list,
+        iterations: int = 5,
+        precision: float = None,
+        max_iterations: int = 30
+    ) -> bool:
+    '''
+    True once a query ran iterations times, or in adaptive mode (precision)
+    once the confidence interval of its response time is narrow enough
+    '''
+    n = len(response_times)
+    if precision is None or n < iterations:
+        return n >= iterations
+    if n >= max_iterations:
+        return True
+
+    return ciHalfWidth(response_times) <= precision * statistics.mean(response_times)
+
+
+def logPath(db_name: str, col_name: str, fn_name: str, i: int, tags: list = None) -> str:
+    '''
+    logs/{db_name}/[{tags}/]{col_name}/{fn}/{fn}_iteration_{i}_{col_name}.json
+
+    the tags folder keeps the database type third in the path, where the
+    notebook expects it
+    '''
+    folder = "/".join([db_name, "_".join(tags)] if tags else [db_name])
+    return f"logs/{folder}/{col_name}/{fn_name}/{fn_name}_iteration_{i}_{col_name}.json"
+
+
+def runTags(
+        index_profile: str = "none",
+        client_config: str = "default",
+        key_distribution: str = "middle",
+        write_concern: str = "default",
+        read_concern: str = "default"
+    ) -> list:
+    '''
+    Options that are not the default get their own log folder
+    '''
+    tags = []
+    if index_profile != "none":
+        tags.append(f"idx_{index_profile}")
+    if client_config != "default":
+        tags.append(f"client_{client_config}")
+    if key_distribution != "middle":
+        tags.append(f"keys_{key_distribution}")
+    if write_concern != "default":
+        tags.append(f"wc_{write_concern}")
+    if read_concern != "default":
+        tags.append(f"rc_{read_concern}")
+
+    return tags
+
+
+def listDatasets(db_type: str) -> list:
+    '''
+    Dataset files (json, ndjson, compressed ndjson) in the folder of a
+    database type
+    '''
+    return [x for x in os.listdir(db_type) if x.endswith(DATA_EXTENSIONS)]
+
+
+def runCell(
+        db: Database,
+        db_type: str,
+        col_name: str,
+        data: list,
+        fn: callable,
+        i: int,
+        tags: list = None,
+        store: ResultStore = None,
+        fixture: Fixture = None,
+        repeat: int = 0,
+        warmup: int = 0,
+        index_profile: str = "none",
+        client_config: str = "default"
+    ) -> dict:
+    '''
+    Measures one iteration of one query and saves it, to the store or to
+    the JSON log of db_type (db can be any database holding the dataset)
+    '''
+    print(f"Running test {col_name}-{fn.__name__}-iteration:{i}")
+    measures = collectMeasure(db, col_name, data, fn, repeat, warmup, fixture, index_profile, client_config)
+
+    # save the results
+    if store is not None:
+        store.append(db_type, col_name, fn.__name__, i, measures)
+        return measures
+
+    print(f"Saving file {col_name}")
+    path = logPath(db_type, col_name, fn.__name__, i, tags)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(measures, f, indent=4)
+
     return measures
 
 
-def run(client: MongoClient, db_name: str):
+def run(
+        client: MongoClient,
+        db_name: str,
+        repeat: int = 0,
+        warmup: int = 0,
+        cache: bool = False,
+        fixture: str = None,
+        index_profile: str = "none",
+        client_config: str = "default",
+        store: ResultStore = None,
+        iterations: int = 5,
+        precision: float = None,
+        max_iterations: int = 30,
+        key_distribution: str = "middle",
+        write_concern: str = "default",
+        read_concern: str = "default"
+    ):
     '''
     This function runs through all the data in a folder and runs the
     structured queries on the data.
+
+    cache: insert the datasets from the pre-encoded BSON cache so client
+    side JSON decode and BSON encode stay out of the measurements
+    fixture: "out" or "rename" restores the collection from a template built
+    once per dataset instead of re-inserting it before every query
+    index_profile: secondary indexes of the collections (indexes.INDEX_PROFILES),
+    other profiles than "none" log to logs/{db_name}/idx_{profile}/...
+    client_config: name of the clientConfig.CLIENT_CONFIGS entry the client
+    was made with (makeClient), only used to label and place the logs
+    store: append the measurements to a results.ResultStore instead of
+    writing a JSON file per iteration
+    iterations: runs of every query, with precision the minimum and the
+    query is repeated until the CI half-width of its response time is at
+    most precision (e.g. 0.05) of the mean, or max_iterations
+    key_distribution: how the single document queries pick their uid
+    (keys.KEY_DISTRIBUTIONS), other than "middle" log to .../keys_{name}/...
+    write_concern, read_concern: concerns of every query (concerns.py),
+    other than "default" log to .../wc_{name}/... and .../rc_{name}/...
     '''
     if db_name not in ["structured", "unstructured"]:
         raise TypeError("invalid database name")
 
-    # lists everything
-    filenames = os.listdir(db_name)
+    if client_config not in CLIENT_CONFIGS:
+        raise TypeError("invalid client config")
 
-    # filter to include only json files
-    filenames = [x for x in filenames if x.endswith("json")]
+    db = concernDatabase(client, db_name, write_concern, read_concern)
+    setDistribution(key_distribution)
+    tags = runTags(index_profile, client_config, key_distribution, write_concern, read_concern)
 
     # loop through datasets
-    for filename in filenames:
+    for filename in listDatasets(db_name):
         data = {}
         path = f"{db_name}/{filename}"
         col_name = filename.split(".")[0]
 
-        unstructured_functions = [
-            insertOneUnstruct, insertManyUnstruct, readOneUnstruct, readManyUnstruct,
-            updateOneUnstruct, updateManyUnstruct, replaceOneUnstruct, insertManyThenDeleteManyUnstruct,
-            insertOneThenUpdateTimestampUnstruct, readThenDeleteManyLikesUnstruct, aggregateUnstruct
-        ]
-
-        structured_functions = [
-            insertOneStruct, insertManyStruct, readOneStruct, readManyStruct,
-            updateOneStruct, updateManyStruct, replaceOneStruct, insertManyThenDeleteManyStruct,
-            insertOneThenUpdateBirthdayStruct, readThenDeleteOldUsersStruct, aggregateStruct
-        ]
-
-
         print("----------")
 
         print(f"Opening file {filename}...")
         # load in the data from the file
-        with open(path, "r") as f:
-            data = json.load(f)
+        data = loadCached(path) if cache else loadData(path)
+        registerKeys(db_name, col_name, data)
 
         # loop through functions -> repeatedly run the test -> record metrics
 
-        functions = structured_functions if db_name == "structured" else unstructured_functions
+        functions = query_functions[db_name]
+
+        fx = None
+        if fixture:
+            print(f"Building template {col_name}...")
+            fx = Fixture(client[db_name], col_name, data, fixture, index_profile)
 
         for fn in functions:
-            for i in range(5):
-                print(f"Running test {col_name}-{fn.__name__}-iteration:{i}")
-                # save the results
-                print(f"Saving file {filename}")
-                os.makedirs(f"logs/{db_name}/{col_name}/{fn.__name__}", exist_ok=True)
-                with open(f"logs/{db_name}/{col_name}/{fn.__name__}/{fn.__name__}_iteration_{i}_{col_name}.json",
-                          "w") as f:
-                    json.dump(collectMeasure(client[db_name], col_name, data, fn), f, indent=4)
+            response_times = []
+            while not enoughIterations(response_times, iterations, precision, max_iterations):
+                i = len(response_times)
+                measures = runCell(
+                    db, db_name, col_name, data, fn, i, tags, store,
+                    fx, repeat, warmup, index_profile, client_config
+                )
+                response_times.append(measures[fn.__name__]["response_time"])
+
+            if precision is not None:
+                width = ciHalfWidth(response_times) / statistics.mean(response_times)
+                print(f"{fn.__name__}: {len(response_times)} iterations, CI half-width {width:.1%} of the mean")
+
+        if fx is not None:
+            fx.drop()
 
 
 if __name__ == "__main__":
     # generate the data in the data pool
     updateDataPool()
 
-    # connect to mongodb
-    client = MongoClient("mongodb://localhost:27017/")
+    # connect to mongodb, the recorder captures the commands to explain
+    # (pool size and compression in clientConfig.CLIENT_CONFIGS)
+    client = makeClient("default", event_listeners=[RECORDER])
 
     # run tests for all structured data tests
     # run(client, "unstructured")
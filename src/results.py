@@ -0,0 +1,185 @@
+from monitor import Sampler
+import json
+import os
+import platform
+import sqlite3
+import time
+
+# one row per measured step, the columns the notebook groups by are typed
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    machine TEXT NOT NULL,
+    test_no INTEGER NOT NULL,
+    started REAL NOT NULL,
+    tags TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    measurement_id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    db_type TEXT NOT NULL,
+    function TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    db_size INTEGER NOT NULL,
+    iteration INTEGER NOT NULL,
+    response_time REAL NOT NULL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    measurement_id INTEGER NOT NULL REFERENCES measurements(measurement_id),
+    sample INTEGER NOT NULL,
+    timestamp REAL,
+    cpu_util REAL,
+    disk_read REAL,
+    disk_write REAL,
+    disk_used REAL,
+    disk_free REAL,
+    virtual_used REAL,
+    virtual_free REAL
+);
+CREATE INDEX IF NOT EXISTS measurements_group
+    ON measurements (db_type, function, db_size, operation);
+CREATE INDEX IF NOT EXISTS samples_measurement
+    ON samples (measurement_id, sample);
+'''
+
+SAMPLE_FIELDS = Sampler.fields
+
+# seconds a writer waits for another process's transaction to finish
+BUSY_TIMEOUT = 60
+
+# suffix the notebook strips from the query names
+SUFFIXES = {"structured": "Struct", "unstructured": "Unstruct"}
+
+class ResultStore:
+    '''
+    Append-only SQLite sink for the measurements of a run, instead of one
+    indent=4 JSON file per (dataset, function, iteration).
+
+    Every collectMeasure result is appended in one transaction: a
+    measurements row per step (delete, create, the query) and a samples
+    row per system sample, the baseline is sample 0 like in the notebook.
+    Everything else a step logs (latency, server, processes, explain, ...)
+    is kept as JSON in the extra column.
+
+    Several processes can append to one store (the scheduler's parallel
+    workers): in WAL mode the writes are serialised, a writer waits up to
+    BUSY_TIMEOUT seconds for the others' transactions before failing.
+    '''
+
+    def __init__(
+            self,
+            path: str = "logs/results.sqlite",
+            machine: str = None,
+            test_no: int = None,
+            tags: list = None
+        ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        # without a test_no every run is a test of its own, numbered after
+        # the machine's last one in the same statement
+        machine = machine or platform.node()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (machine, test_no, started, tags) "
+                "SELECT ?, COALESCE(?, MAX(test_no) + 1, 0), ?, ? FROM runs WHERE machine = ?",
+                (machine, test_no, time.time(), "_".join(tags or []), machine)
+            )
+        self.run_id = cursor.lastrowid
+        self.test_no = self.conn.execute("SELECT test_no FROM runs WHERE run_id = ?", (self.run_id,)).fetchone()[0]
+
+    def append(self, db_type: str, col_name: str, fn_name: str, iteration: int, measures: dict):
+        '''
+        Appends the steps of one collectMeasure result
+        '''
+        db_size = int(col_name.split("_")[-1])
+        function = fn_name.removesuffix(SUFFIXES[db_type])
+
+        with self.conn:
+            for step, result in measures.items():
+                operation = step if step in ["create", "delete"] else "execute"
+                extra = {
+                    k: v for k, v in result.items()
+                    if k not in ["baseline", "samples", "response_time"]
+                }
+
+                cursor = self.conn.execute(
+                    "INSERT INTO measurements "
+                    "(run_id, db_type, function, operation, db_size, iteration, response_time, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.run_id, db_type, function, operation, db_size, iteration,
+                        result["response_time"], json.dumps(extra) if extra else None
+                    )
+                )
+
+                rows = [{**result["baseline"], "sample": 0}] + result["samples"]
+                self.conn.executemany(
+                    f"INSERT INTO samples (measurement_id, sample, {', '.join(SAMPLE_FIELDS)}) "
+                    f"VALUES (?, ?{', ?' * len(SAMPLE_FIELDS)})",
+                    [
+                        (cursor.lastrowid, row["sample"], *[row.get(k) for k in SAMPLE_FIELDS])
+                        for row in rows
+                    ]
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def nextTestNo(path: str, machine: str = None) -> int:
+    '''
+    test_no after the machine's last run in a store, 0 for a new store
+    '''
+    if not os.path.exists(path):
+        return 0
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        row = conn.execute(
+            "SELECT MAX(test_no) FROM runs WHERE machine = ?", (machine or platform.node(),)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    return 0 if row[0] is None else row[0] + 1
+
+def loadResults(path: str = "logs/results.sqlite"):
+    '''
+    The whole store in one query, as the frame the notebook's runExtract
+    builds (one row per sample, baseline is sample 0), variant is the
+    run's tags like the tags folder of the JSON logs. run_id and tags are
+    kept so runs that share a test_no are not merged (analysisStats
+    groups by run_id when the frame has it).
+    '''
+    import pandas as pd
+
+    query = f'''
+        SELECT r.machine, m.db_type,
+            CASE WHEN r.tags = '' THEN 'default' ELSE r.tags END AS variant,
+            m.function, m.operation, m.db_size,
+            r.test_no, m.iteration, s.sample,
+            {", ".join(f"s.{k}" for k in SAMPLE_FIELDS if k != "timestamp")},
+            m.response_time, r.run_id, r.tags
+        FROM measurements m
+        JOIN runs r ON r.run_id = m.run_id
+        JOIN samples s ON s.measurement_id = m.measurement_id
+        ORDER BY m.measurement_id, s.sample
+    '''
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(query, conn)
+    finally:
+        conn.close()
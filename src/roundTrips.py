@@ -0,0 +1,220 @@
+from monitor import measureFn
+import queries
+from queries import data_pool, updateDataPool, deleteCol, createCol
+from clientConfig import makeClient
+from dataGen import loadData, genBirthday
+from instrument import RECORDER, clientOverhead
+from keys import registerKeys
+import argparse
+import json
+import os
+import statistics
+from pymongo import DeleteOne, ReturnDocument
+from pymongo.database import Database
+
+# uids per delete_many when the $in list is chunked
+IN_CHUNK = 1000
+
+# -- Structured Variants
+
+def readThenBulkDeleteOldUsersStruct(db: Database, col_name: str):
+    '''
+    Read the uids of users with age > 130, delete them in one bulk_write
+    '''
+    old_users = list(db[col_name].find({"age": {"$gt": 130}}, {"uid": 1}))
+    if old_users:
+        db[col_name].bulk_write([DeleteOne({"uid": user["uid"]}) for user in old_users], ordered=False)
+
+def readThenDeleteInOldUsersStruct(db: Database, col_name: str):
+    '''
+    Read the uids of users with age > 130, delete_many with $in chunks
+    '''
+    uids = [user["uid"] for user in db[col_name].find({"age": {"$gt": 130}}, {"uid": 1})]
+    for i in range(0, len(uids), IN_CHUNK):
+        db[col_name].delete_many({"uid": {"$in": uids[i:i + IN_CHUNK]}})
+
+def deleteManyOldUsersStruct(db: Database, col_name: str):
+    '''
+    The read is only there to find what to delete, one delete_many does both
+    '''
+    db[col_name].delete_many({"age": {"$gt": 130}})
+
+def insertUpdatedBirthdayStruct(db: Database, col_name: str):
+    '''
+    Insert the user with the updated birthday already set
+    '''
+    user = data_pool["struct_insert_one"].copy()
+    user["birthday"] = genBirthday(user["age"], user["uid"]).strftime("%d-%m-%Y")
+    db[col_name].insert_one(user)
+
+def upsertBirthdayStruct(db: Database, col_name: str):
+    '''
+    One find_one_and_update upsert: inserts the user with the new birthday,
+    updates the birthday if the uid is already there
+    '''
+    user = data_pool["struct_insert_one"].copy()
+    birthday = genBirthday(user["age"], user["uid"]).strftime("%d-%m-%Y")
+    db[col_name].find_one_and_update(
+        {"uid": user["uid"]},
+        {
+            "$setOnInsert": {k: v for k, v in user.items() if k not in ["_id", "uid", "birthday"]},
+            "$set": {"birthday": birthday},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+# -- Unstructured Variants
+
+def readThenBulkDeleteManyLikesUnstruct(db: Database, col_name: str):
+    '''
+    Finds documents with 130+ likes then deletes them in one bulk_write
+    '''
+    old_users = list(db[col_name].find({"likes": {"$exists": True, "$gt": 130}}, {"uid": 1}))
+    if old_users:
+        db[col_name].bulk_write([DeleteOne({"uid": user["uid"]}) for user in old_users], ordered=False)
+
+def readThenDeleteInManyLikesUnstruct(db: Database, col_name: str):
+    '''
+    Finds documents with 130+ likes then delete_many with $in chunks
+    '''
+    uids = [user["uid"] for user in db[col_name].find({"likes": {"$exists": True, "$gt": 130}}, {"uid": 1})]
+    for i in range(0, len(uids), IN_CHUNK):
+        db[col_name].delete_many({"uid": {"$in": uids[i:i + IN_CHUNK]}})
+
+def deleteManyLikesUnstruct(db: Database, col_name: str):
+    '''
+    Deletes the documents with 130+ likes in one delete_many
+    '''
+    db[col_name].delete_many({"likes": {"$exists": True, "$gt": 130}})
+
+def insertUpdatedTimestampUnstruct(db: Database, col_name: str):
+    '''
+    Inserts the document with the updated timestamp already set
+    '''
+    user = data_pool["unstruct_insert_one"].copy()
+    user["timestamp"] = "01-01-2025 00:00:00"
+    db[col_name].insert_one(user)
+
+def upsertTimestampUnstruct(db: Database, col_name: str):
+    '''
+    One find_one_and_update upsert of the document with the new timestamp
+    '''
+    user = data_pool["unstruct_insert_one"].copy()
+    db[col_name].find_one_and_update(
+        {"uid": user.get("uid")},
+        {
+            "$setOnInsert": {k: v for k, v in user.items() if k not in ["_id", "uid", "timestamp"]},
+            "$set": {"timestamp": "01-01-2025 00:00:00"},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+# multi-step queries of the run matrix and their round trip saving variants
+VARIANTS = {
+    "structured": {
+        "readThenDeleteOldUsersStruct": [
+            readThenBulkDeleteOldUsersStruct, readThenDeleteInOldUsersStruct, deleteManyOldUsersStruct,
+        ],
+        "insertOneThenUpdateBirthdayStruct": [
+            insertUpdatedBirthdayStruct, upsertBirthdayStruct,
+        ],
+    },
+    "unstructured": {
+        "readThenDeleteManyLikesUnstruct": [
+            readThenBulkDeleteManyLikesUnstruct, readThenDeleteInManyLikesUnstruct, deleteManyLikesUnstruct,
+        ],
+        "insertOneThenUpdateTimestampUnstruct": [
+            insertUpdatedTimestampUnstruct, upsertTimestampUnstruct,
+        ],
+    },
+}
+
+# -- Suite
+def measureRoundTrips(db: Database, col_name: str, data: list, fn: callable) -> dict:
+    '''
+    One call of fn on a fresh copy of the dataset: response time, the
+    commands it sent (round trips, getMores included) and the server
+    opcounter deltas
+    '''
+    deleteCol(db, col_name)
+    createCol(db, col_name, data)
+
+    with RECORDER.recording() as commands:
+        result = measureFn(fn, 0.1, db, col_name, server=(db, col_name))
+
+    delta = result["server"]["delta"]
+    return {
+        **clientOverhead(result["response_time"], RECORDER.timeline(), recorder_time=RECORDER.recorder_time),
+        "response_time": result["response_time"],
+        "round_trips": len(commands),
+        "commands": [name for name, _ in commands],
+        "server_ops": {k: v for k, v in delta.items() if k.startswith("opcounters_")},
+        "network_bytes_in": delta.get("network_bytes_in"),
+        "network_bytes_out": delta.get("network_bytes_out"),
+        "documents_after": db[col_name].estimated_document_count(),
+    }
+
+def benchmarkRoundTrips(client, db_name: str, path: str, iterations: int = 5) -> dict:
+    '''
+    Runs every multi-step query and its variants iterations times on the
+    dataset at path and saves the comparison to logs/roundtrips
+    '''
+    col_name = os.path.basename(path).split(".")[0]
+
+    print(f"Opening file {path}...")
+    data = loadData(path)
+    registerKeys(db_name, col_name, data)
+
+    report = {}
+    for base_name, variants in VARIANTS[db_name].items():
+        report[base_name] = {}
+        for fn in [getattr(queries, base_name)] + variants:
+            runs = []
+            for i in range(iterations):
+                print(f"Running round trips {col_name}-{fn.__name__}-iteration:{i}")
+                runs.append(measureRoundTrips(client[db_name], col_name, data, fn))
+
+            times = [r["response_time"] for r in runs]
+            report[base_name][fn.__name__] = {
+                "response_time": statistics.mean(times),
+                "response_time_median": statistics.median(times),
+                "round_trips": runs[-1]["round_trips"],
+                "server_ops": runs[-1]["server_ops"],
+                "documents_after": runs[-1]["documents_after"],
+                "runs": runs,
+            }
+
+        base = report[base_name][base_name]
+        for name, r in report[base_name].items():
+            print(
+                f"{name}: {r['response_time'] * 1000:.2f} ms "
+                f"({r['response_time'] / base['response_time']:.0%} of {base_name}), "
+                f"{r['round_trips']} round trips, {r['documents_after']} documents after"
+            )
+
+    deleteCol(client[db_name], col_name)
+
+    os.makedirs(f"logs/roundtrips/{db_name}", exist_ok=True)
+    with open(f"logs/roundtrips/{db_name}/roundtrips_{col_name}.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+    return report
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="multi-step queries against their round trip saving variants")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_100000.json")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    db_name = "unstructured" if args.path.startswith("unstructured") else "structured"
+
+    # generate the data in the data pool
+    updateDataPool()
+
+    # the recorder counts the commands every variant sends
+    client = makeClient("default", event_listeners=[RECORDER])
+
+    benchmarkRoundTrips(client, db_name, args.path, args.iterations)
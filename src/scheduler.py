@@ -0,0 +1,281 @@
+from queries import query_functions, updateDataPool, listDatasets, runTags, runCell, data_pool
+from keys import KEY_DISTRIBUTIONS, registerKeys, setDistribution
+from concerns import READ_CONCERNS, WRITE_CONCERNS, concernDatabase
+from bsonCache import loadCached
+from clientConfig import CLIENT_CONFIGS, makeClient
+from dataGen import loadData
+from fixtures import Fixture
+from instrument import RECORDER
+from results import ResultStore, nextTestNo
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+
+# options of a matrix cell, as the keyword arguments of queries.run
+OPTIONS = {
+    "repeat": 0,
+    "warmup": 0,
+    "cache": False,
+    "fixture": None,
+    "index_profile": "none",
+    "client_config": "default",
+    "key_distribution": "middle",
+    "write_concern": "default",
+    "read_concern": "default",
+}
+
+def cellId(cell: dict) -> str:
+    '''
+    Stable name of a cell, e.g. structured/index_profile=uid/data_1000/readOneStruct/3
+    '''
+    options = ",".join(f"{k}={v}" for k, v in cell["options"].items() if v != OPTIONS[k])
+    return "/".join([cell["db_type"], options or "default", cell["col_name"], cell["function"], str(cell["iteration"])])
+
+def datasetSize(filename: str) -> int:
+    return int(filename.split(".")[0].split("_")[-1])
+
+def expandMatrix(
+        db_types: list,
+        sizes: list = None,
+        functions: list = None,
+        iterations: int = 5,
+        options: list = None
+    ) -> list:
+    '''
+    Every (db type, dataset, options, function, iteration) cell, in the
+    order queries.run measures them. sizes and functions filter the
+    datasets and queries, options is a list of option dicts (OPTIONS).
+    '''
+    options = [{**OPTIONS, **o} for o in (options or [{}])]
+    cells = []
+    for db_type in db_types:
+        if db_type not in query_functions:
+            raise TypeError("invalid database name")
+
+        # one file per collection, smallest first
+        datasets = {}
+        for filename in sorted(listDatasets(db_type), key=datasetSize):
+            datasets.setdefault(filename.split(".")[0], filename)
+
+        for (col_name, filename), option in itertools.product(datasets.items(), options):
+            if sizes and datasetSize(filename) not in sizes:
+                continue
+
+            for fn, i in itertools.product(query_functions[db_type], range(iterations)):
+                if functions and fn.__name__ not in functions:
+                    continue
+
+                cell = {
+                    "db_type": db_type,
+                    "dataset": filename,
+                    "col_name": col_name,
+                    "function": fn.__name__,
+                    "iteration": i,
+                    "options": option,
+                }
+                cells.append({"id": cellId(cell), **cell})
+
+    return cells
+
+def createManifest(path: str, cells: list, store: str = None, cache: bool = False):
+    '''
+    Writes the manifest of a matrix, completed cells go to {path}.done
+
+    store: results store the cells append to instead of the JSON logs
+    cache: the data pool is loaded from the BSON cache
+    '''
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"store": store, "cache": cache, "cells": cells}, f, indent=4)
+
+    if os.path.exists(f"{path}.done"):
+        os.remove(f"{path}.done")
+
+def completedCells(path: str) -> set:
+    if not os.path.exists(f"{path}.done"):
+        return set()
+
+    with open(f"{path}.done") as f:
+        return {line.strip() for line in f if line.strip()}
+
+def markCompleted(path: str, cell_id: str):
+    '''
+    One line per finished cell, appended and flushed so a crash loses at
+    most the cell that was running
+    '''
+    with open(f"{path}.done", "a") as f:
+        f.write(cell_id + "\n")
+
+def pendingJobs(path: str) -> list:
+    '''
+    Cells still to run grouped into jobs: one job per (db type, dataset,
+    options), so a dataset is loaded and its fixture built once per job
+    '''
+    with open(path) as f:
+        cells = json.load(f)["cells"]
+
+    done = completedCells(path)
+    jobs = {}
+    for cell in cells:
+        if cell["id"] in done:
+            continue
+        key = (cell["db_type"], cell["dataset"], json.dumps(cell["options"], sort_keys=True))
+        jobs.setdefault(key, []).append(cell)
+
+    return list(jobs.values())
+
+def runJob(path: str, cells: list, db_name: str = None, store: str = None, test_no: int = None):
+    '''
+    Runs the cells of one job on db_name (the db type by default) and
+    records each of them in the manifest as it completes
+    '''
+    first = cells[0]
+    db_type, options = first["db_type"], {**OPTIONS, **first["options"]}
+    db_name = db_name or db_type
+    col_name = first["col_name"]
+    functions = {fn.__name__: fn for fn in query_functions[db_type]}
+    tags = runTags(
+        options["index_profile"], options["client_config"], options["key_distribution"],
+        options["write_concern"], options["read_concern"]
+    )
+
+    client = makeClient(options["client_config"], event_listeners=[RECORDER])
+    db = concernDatabase(client, db_name, options["write_concern"], options["read_concern"])
+    results = ResultStore(store, test_no=test_no, tags=tags) if store else None
+
+    print(f"Opening file {first['dataset']}...")
+    dataset = f"{db_type}/{first['dataset']}"
+    data = loadCached(dataset) if options["cache"] else loadData(dataset)
+    setDistribution(options["key_distribution"])
+    registerKeys(db_name, col_name, data)
+
+    fx = None
+    if options["fixture"]:
+        print(f"Building template {col_name}...")
+        fx = Fixture(client[db_name], col_name, data, options["fixture"], options["index_profile"])
+
+    for cell in cells:
+        runCell(
+            db, db_type, col_name, data, functions[cell["function"]], cell["iteration"],
+            tags, results, fx, options["repeat"], options["warmup"],
+            options["index_profile"], options["client_config"]
+        )
+        markCompleted(path, cell["id"])
+
+    if fx is not None:
+        fx.drop()
+    if results is not None:
+        results.close()
+    client.close()
+
+# database slot of a worker process
+worker_slot = None
+
+def initWorker(slots: multiprocessing.Queue, cache: bool):
+    global worker_slot
+    worker_slot = slots.get()
+    if not data_pool:
+        updateDataPool(cache)
+
+def runSlotJob(path: str, cells: list, store: str = None, test_no: int = None):
+    runJob(path, cells, f"{cells[0]['db_type']}_{worker_slot}", store, test_no)
+
+def runManifest(path: str, workers: int = 1):
+    '''
+    Runs the pending cells of a manifest. With workers > 1 the jobs run in
+    that many processes, each on its own databases ({db_type}_{slot}) so
+    the jobs do not share collections. Parallel jobs compete for the same
+    server, so only use it when throughput of the matrix matters more than
+    isolated measurements. The workers append to the same results store,
+    one at a time (results.BUSY_TIMEOUT).
+    '''
+    with open(path) as f:
+        manifest = json.load(f)
+    store, cache = manifest["store"], manifest["cache"]
+
+    # every job of a manifest is one test of the store, resumes included
+    test_no = manifest.get("test_no")
+    if store and test_no is None:
+        test_no = manifest["test_no"] = nextTestNo(store)
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=4)
+
+    jobs = pendingJobs(path)
+    print(f"{sum(len(job) for job in jobs)} cells left in {len(jobs)} jobs")
+
+    if workers <= 1:
+        if not data_pool:
+            updateDataPool(cache)
+        for cells in jobs:
+            runJob(path, cells, store=store, test_no=test_no)
+        return
+
+    slots = multiprocessing.Queue()
+    for slot in range(workers):
+        slots.put(slot)
+
+    with ProcessPoolExecutor(workers, initializer=initWorker, initargs=(slots, cache)) as pool:
+        futures = [pool.submit(runSlotJob, path, cells, store, test_no) for cells in jobs]
+        for future in futures:
+            future.result()
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="resumable benchmark matrix")
+    parser.add_argument("manifest", help="manifest file, e.g. logs/manifests/full.json")
+    parser.add_argument("--db-types", default="structured,unstructured")
+    parser.add_argument("--sizes", default=None, help="comma separated dataset sizes, all by default")
+    parser.add_argument("--functions", default=None, help="comma separated queries, all by default")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--index-profiles", default="none", help="comma separated index profiles")
+    parser.add_argument("--client-configs", default="default", help="comma separated client configs")
+    parser.add_argument("--key-distributions", default="middle", help="comma separated key distributions")
+    parser.add_argument("--write-concerns", default="default", help=f"comma separated, any of {','.join(WRITE_CONCERNS)}")
+    parser.add_argument("--read-concerns", default="default", help=f"comma separated, any of {','.join(READ_CONCERNS)}")
+    parser.add_argument("--fixture", choices=["out", "rename"], default=None)
+    parser.add_argument("--repeat", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="insert the datasets from the BSON cache")
+    parser.add_argument("--store", default=None, help="results store instead of JSON logs")
+    parser.add_argument("--workers", type=int, default=1, help="jobs run in parallel on separate databases")
+    parser.add_argument("--new", action="store_true", help="overwrite an existing manifest")
+    args = parser.parse_args()
+
+    # an existing manifest is resumed as it is
+    if args.new or not os.path.exists(args.manifest):
+        options = [
+            {
+                "index_profile": profile, "client_config": config, "key_distribution": distribution,
+                "write_concern": write, "read_concern": read,
+                "fixture": args.fixture, "repeat": args.repeat, "warmup": args.warmup, "cache": args.cache,
+            }
+            for profile, config, distribution, write, read in itertools.product(
+                args.index_profiles.split(","), args.client_configs.split(","),
+                args.key_distributions.split(","), args.write_concerns.split(","),
+                args.read_concerns.split(",")
+            )
+        ]
+        for option in options:
+            if option["client_config"] not in CLIENT_CONFIGS:
+                raise TypeError("invalid client config")
+            if option["key_distribution"] not in KEY_DISTRIBUTIONS:
+                raise TypeError("invalid key distribution")
+            if option["write_concern"] not in WRITE_CONCERNS:
+                raise TypeError("invalid write concern")
+            if option["read_concern"] not in READ_CONCERNS:
+                raise TypeError("invalid read concern")
+
+        cells = expandMatrix(
+            args.db_types.split(","),
+            [int(x) for x in args.sizes.split(",")] if args.sizes else None,
+            args.functions.split(",") if args.functions else None,
+            args.iterations,
+            options
+        )
+        createManifest(args.manifest, cells, args.store, args.cache)
+        print(f"Manifest {args.manifest} with {len(cells)} cells")
+
+    runManifest(args.manifest, args.workers)
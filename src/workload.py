@@ -0,0 +1,312 @@
+from monitor import LatencyHistogram
+import queries
+from queries import updateDataPool, deleteCol, createCol, prepareCall
+from clientConfig import makeClient
+from dataGen import loadData
+from keys import KEY_DISTRIBUTIONS, registerKeys, setDistribution
+from concerns import READ_CONCERNS, WRITE_CONCERNS, concernDatabase
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from pymongo.errors import PyMongoError
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# suffix of the query functions per database type
+SUFFIXES = {"structured": "Struct", "unstructured": "Unstruct"}
+
+# fields of a spec that are not set
+SPEC_DEFAULTS = {
+    "db_type": "structured",
+    "duration": 10,
+    "ops": None,
+    "concurrency": 8,
+    "seed": None,
+    "key_distribution": "middle",
+    "write_concern": "default",
+    "read_concern": "default",
+}
+
+# YCSB core workloads A-F over the existing queries. An op is a query name
+# without its Struct/Unstruct suffix, or a list of names run back to back
+# as one operation, key_distribution picks the uids (keys.py). Every query
+# of a list picks its own uid, readModifyWrite reads and writes one, and
+# insertLatest inserts a new uid that the key space grows by.
+WORKLOADS = {
+    "ycsb_a": {
+        "key_distribution": "zipfian",
+        "description": "update heavy, 50% read / 50% update",
+        "operations": [
+            {"op": "readOne", "weight": 50},
+            {"op": "updateOne", "weight": 50},
+        ],
+    },
+    "ycsb_b": {
+        "key_distribution": "zipfian",
+        "description": "read mostly, 95% read / 5% update",
+        "operations": [
+            {"op": "readOne", "weight": 95},
+            {"op": "updateOne", "weight": 5},
+        ],
+    },
+    "ycsb_c": {
+        "key_distribution": "zipfian",
+        "description": "read only",
+        "operations": [
+            {"op": "readOne", "weight": 100},
+        ],
+    },
+    "ycsb_d": {
+        "key_distribution": "latest",
+        "description": "read latest, 95% read / 5% insert",
+        "operations": [
+            {"op": "readOne", "weight": 95},
+            {"op": "insertLatest", "weight": 5},
+        ],
+    },
+    "ycsb_e": {
+        "key_distribution": "zipfian",
+        "description": "short ranges, 95% scan / 5% insert",
+        "operations": [
+            {"op": "scan", "weight": 95},
+            {"op": "insertLatest", "weight": 5},
+        ],
+    },
+    "ycsb_f": {
+        "key_distribution": "zipfian",
+        "description": "read-modify-write, 50% read / 50% read then update",
+        "operations": [
+            {"op": "readOne", "weight": 50},
+            {"op": "readModifyWrite", "weight": 50},
+        ],
+    },
+}
+
+# -- Specs
+def loadSpec(spec: str) -> dict:
+    '''
+    A preset name (WORKLOADS) or a JSON/YAML spec file, with the defaults
+    filled in
+    '''
+    if spec in WORKLOADS:
+        loaded = {"name": spec, **WORKLOADS[spec]}
+    elif spec.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ImportError("yaml specs need the pyyaml package")
+        with open(spec) as f:
+            loaded = yaml.safe_load(f)
+    else:
+        with open(spec) as f:
+            loaded = json.load(f)
+
+    loaded.setdefault("name", os.path.basename(spec).split(".")[0])
+    return {**SPEC_DEFAULTS, **loaded}
+
+def resolveQuery(name: str, db_type: str) -> callable:
+    '''
+    Query function of a name, with or without the Struct/Unstruct suffix
+    '''
+    if not name.endswith(SUFFIXES[db_type]):
+        name += SUFFIXES[db_type]
+
+    fn = getattr(queries, name, None)
+    if not callable(fn):
+        raise TypeError(f"invalid query {name}")
+
+    return fn
+
+def buildMix(spec: dict) -> list:
+    '''
+    [(name, [functions], weight)] of the spec's operations
+    '''
+    if spec["db_type"] not in SUFFIXES:
+        raise TypeError("invalid database name")
+    if not spec["operations"]:
+        raise ValueError("a workload needs at least one operation")
+
+    mix = []
+    for operation in spec["operations"]:
+        ops = operation["op"] if isinstance(operation["op"], list) else [operation["op"]]
+        name = operation.get("name", "Then".join(ops))
+        if operation["weight"] <= 0:
+            raise ValueError(f"weight of {name} must be positive")
+
+        mix.append((name, [resolveQuery(op, spec["db_type"]) for op in ops], operation["weight"]))
+
+    return mix
+
+# -- Engine
+def mixWorker(mix: list, db, col_name: str, stop_at: int, budget, rng: random.Random) -> dict:
+    '''
+    Closed loop over the mix until stop_at (ns) or the shared op budget
+    runs out, every operation picked at random by weight
+    '''
+    histograms = {name: LatencyHistogram() for name, _, _ in mix}
+    errors = {name: {} for name, _, _ in mix}
+    cum_weights = list(itertools.accumulate(weight for _, _, weight in mix))
+
+    while time.perf_counter_ns() < stop_at and (budget is None or next(budget, None) is not None):
+        name, fns, _ = rng.choices(mix, cum_weights=cum_weights)[0]
+        for fn in fns:
+            prepareCall(fn)
+
+        time_0 = time.perf_counter_ns()
+        try:
+            for fn in fns:
+                fn(db, col_name)
+        except PyMongoError as e:
+            err = type(e).__name__
+            errors[name][err] = errors[name].get(err, 0) + 1
+            continue
+
+        histograms[name].record(time.perf_counter_ns() - time_0)
+
+    return {"histograms": histograms, "errors": errors}
+
+def report(histogram: LatencyHistogram, errors: dict, elapsed: float) -> dict:
+    return {
+        "ops": histogram.total,
+        "errors": errors,
+        "ops_per_sec": histogram.total / elapsed,
+        "latency": histogram.summary(),
+        "histogram": histogram.toJson(),
+    }
+
+def runWorkload(client, spec: dict, col_name: str, db_name: str = None) -> dict:
+    '''
+    Runs the spec's operation mix from concurrency threads sharing the
+    client, until duration seconds passed or ops operations are done
+    (whichever is first, either can be null), and reports the throughput
+    and latency per operation and overall
+    '''
+    mix = buildMix(spec)
+    if not spec["duration"] and not spec["ops"]:
+        raise ValueError("a workload needs a duration or an op count")
+
+    db = concernDatabase(client, db_name or spec["db_type"], spec["write_concern"], spec["read_concern"])
+    workers = spec["concurrency"]
+    setDistribution(spec["key_distribution"], spec["seed"])
+
+    # ops is shared by all the threads, next() on a range iterator is atomic
+    budget = iter(range(spec["ops"])) if spec["ops"] else None
+    duration = spec["duration"] or float("inf")
+    seed = spec["seed"] if spec["seed"] is not None else time.time_ns()
+
+    results = [None] * workers
+    # exceptions that are not query errors, raised once all threads joined
+    failures = []
+    start = time.perf_counter_ns()
+    stop_at = start + duration * 1e9
+
+    def threadWorker(idx: int):
+        rng = random.Random(f"{seed}-{idx}")
+        try:
+            results[idx] = mixWorker(mix, db, col_name, stop_at, budget, rng)
+        except Exception as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=threadWorker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failures:
+        raise failures[0]
+
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+
+    # combine the workers, per operation and overall
+    operations = {}
+    overall = LatencyHistogram()
+    overall_errors = {}
+    for name, _, _ in mix:
+        histogram = LatencyHistogram()
+        errors = {}
+        for r in results:
+            histogram.merge(r["histograms"][name])
+            for err, count in r["errors"][name].items():
+                errors[err] = errors.get(err, 0) + count
+                overall_errors[err] = overall_errors.get(err, 0) + count
+
+        overall.merge(histogram)
+        operations[name] = report(histogram, errors, elapsed)
+
+    return {
+        "workload": spec["name"],
+        "db_type": spec["db_type"],
+        "concurrency": workers,
+        "duration": elapsed,
+        "seed": seed,
+        "key_distribution": spec["key_distribution"],
+        "write_concern": spec["write_concern"],
+        "read_concern": spec["read_concern"],
+        **report(overall, overall_errors, elapsed),
+        "operations": operations,
+    }
+
+def benchmarkWorkload(spec: dict, path: str, client_config: str = "default") -> dict:
+    '''
+    Runs a workload on a fresh copy of the dataset at path and saves the
+    report to logs/workload
+    '''
+    db_name = spec["db_type"]
+    col_name = os.path.basename(path).split(".")[0]
+
+    print(f"Opening file {path}...")
+    data = loadData(path)
+    registerKeys(db_name, col_name, data)
+
+    client = makeClient(client_config)
+    deleteCol(client[db_name], col_name)
+    createCol(client[db_name], col_name, data)
+
+    print(f"Running workload {col_name}-{spec['name']}-threads:{spec['concurrency']}")
+    result = runWorkload(client, spec, col_name)
+    client.close()
+
+    for name, r in result["operations"].items():
+        print(
+            f"{name}: {r['ops_per_sec']:.1f} ops/sec, "
+            f"p99 {r['latency'].get('p99', 0) * 1000:.2f} ms"
+        )
+    print(f"total: {result['ops_per_sec']:.1f} ops/sec, {sum(result['errors'].values())} errors")
+
+    os.makedirs(f"logs/workload/{db_name}/{col_name}", exist_ok=True)
+    with open(f"logs/workload/{db_name}/{col_name}/{spec['name']}_workload_{col_name}.json", "w") as f:
+        json.dump(result, f, indent=4)
+
+    return result
+
+# -- Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="weighted operation mixes (YCSB style workloads)")
+    parser.add_argument("spec", help=f"preset ({', '.join(WORKLOADS)}) or a JSON/YAML spec file")
+    parser.add_argument("path", help="dataset file, e.g. structured/data_10000.json")
+    parser.add_argument("--db-type", choices=list(SUFFIXES), default=None, help="overrides the spec")
+    parser.add_argument("--duration", type=float, default=None, help="overrides the spec")
+    parser.add_argument("--ops", type=int, default=None, help="overrides the spec")
+    parser.add_argument("--concurrency", type=int, default=None, help="overrides the spec")
+    parser.add_argument("--seed", type=int, default=None, help="overrides the spec")
+    parser.add_argument("--key-distribution", choices=KEY_DISTRIBUTIONS, default=None, help="overrides the spec")
+    parser.add_argument("--write-concern", choices=list(WRITE_CONCERNS), default=None, help="overrides the spec")
+    parser.add_argument("--read-concern", choices=list(READ_CONCERNS), default=None, help="overrides the spec")
+    parser.add_argument("--client-config", default="default")
+    args = parser.parse_args()
+
+    spec = loadSpec(args.spec)
+    for key in ["db_type", "duration", "ops", "concurrency", "seed", "key_distribution", "write_concern", "read_concern"]:
+        if getattr(args, key) is not None:
+            spec[key] = getattr(args, key)
+
+    # generate the data in the data pool
+    updateDataPool()
+
+    benchmarkWorkload(spec, args.path, args.client_config)